@@ -2,17 +2,26 @@
 Módulo de autenticación con JWT
 Maneja la creación de tokens, verificación y hash de contraseñas
 """
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from sqlalchemy import case, select, update
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
+import anyio
+import bcrypt
+import jwt
+import orjson
 import os
+import threading
+import time
 
-from . import models, schemas
+from . import models
 from .database import get_db
 
 # Cargar variables de entorno
@@ -21,23 +30,134 @@ load_dotenv()
 # Configuración de seguridad
 SECRET_KEY = os.getenv("SECRET_KEY", "tu-clave-secreta-super-segura-cambiala-en-produccion")
 ALGORITHM = "HS256"
+_SECRET_BYTES = SECRET_KEY.encode("utf-8")  # Clave ya codificada, reutilizada en cada firma/verificación
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 días
 
-# Contexto para hash de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Parámetros de Argon2id para contraseñas nuevas (memoria en KiB)
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Prefijos de hashes bcrypt heredados (incluye los generados por passlib); se
+# siguen verificando y se migran a Argon2id en el siguiente login correcto
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+ARGON2_PREFIX = "$argon2"
+
+_password_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+
+
+
+class _OrjsonJWT(jwt.PyJWT):
+    """PyJWT usando orjson para serializar y parsear el payload"""
+    
+    def _encode_payload(self, payload, headers=None, json_encoder=None) -> bytes:
+        return orjson.dumps(payload)
+    
+    def _decode_payload(self, decoded: dict) -> dict:
+        try:
+            payload = orjson.loads(decoded["payload"])
+        except orjson.JSONDecodeError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}") from e
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+        return payload
+
+
+_jwt = _OrjsonJWT()
 
 # OAuth2 scheme para obtener el token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+
+@dataclass(frozen=True, slots=True)
+class AuthUser:
+    """Usuario autenticado: solo las columnas públicas, sin instancia ORM"""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    created_at: datetime
+
+
+# Columnas leídas para autenticar (nunca se hidrata el modelo completo)
+_AUTH_USER_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.is_active,
+    models.User.created_at,
+)
+
+# Cache de autenticación: token -> (usuario, válido hasta, exp del token)
+# El usuario se vuelve a leer de la BD cada AUTH_CACHE_TTL_SECONDS como máximo
+AUTH_CACHE_TTL_SECONDS = 30
+AUTH_CACHE_MAX_SIZE = 4096
+_auth_cache: "OrderedDict[str, tuple[AuthUser, float, float]]" = OrderedDict()
+_auth_cache_lock = threading.Lock()
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verificar si la contraseña coincide con el hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verificar si la contraseña coincide con el hash (Argon2id o bcrypt heredado)"""
+    if not hashed_password:
+        return False
+    
+    if hashed_password.startswith(ARGON2_PREFIX):
+        try:
+            return _password_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    
+    return False
 
 
 def get_password_hash(password: str) -> str:
-    """Generar hash de contraseña"""
-    return pwd_context.hash(password)
+    """Generar hash de contraseña con Argon2id"""
+    return _password_hasher.hash(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Indica si el hash es bcrypt o usa parámetros de Argon2 distintos a los actuales"""
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        return True
+    return _password_hasher.check_needs_rehash(hashed_password)
+
+
+def normalize_email(email: str) -> str:
+    """Forma canónica del email (sin espacios y en minúsculas) usada para guardar y buscar"""
+    return email.strip().lower()
+
+
+def email_lookup_keys(email: str) -> tuple[str, str]:
+    """Claves de búsqueda: forma normalizada y la original (usuarios registrados antes de normalizar)"""
+    stripped = email.strip()
+    return (stripped.lower(), stripped)
+
+
+def email_lookup_order(email: str):
+    """
+    Orden para las filas de email_lookup_keys
+    
+    Si dos filas heredadas coinciden (una por cada forma) gana la escrita igual
+    que el email ingresado, para que el resultado no dependa del plan de la BD.
+    """
+    return case((models.User.email == email.strip(), 0), else_=1)
+
+
+# Hash de referencia para igualar el tiempo de respuesta cuando el email no existe
+_DUMMY_HASH = get_password_hash("control-gastos-dummy-password")
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verificar contraseña en un hilo aparte para no bloquear el event loop"""
+    return await anyio.to_thread.run_sync(verify_password, plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -45,25 +165,58 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     Crear token JWT
     
     Args:
-        data: Datos a codificar en el token (normalmente user_id)
+        data: Datos a codificar en el token (normalmente {"sub": user_id})
         expires_delta: Tiempo de expiración personalizado
     
     Returns:
         Token JWT como string
     """
-    to_encode = data.copy()
-    
+    # Expiración como timestamp entero (NumericDate del estándar JWT)
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    
+    to_encode = {**data, "exp": expire}
+    
+    # El estándar JWT exige que "sub" sea string; los llamadores pasan el id entero
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _jwt.encode(to_encode, _SECRET_BYTES, algorithm=ALGORITHM)
     
     return encoded_jwt
 
 
+def create_access_token_for(user_id: int) -> str:
+    """Crear token JWT para un usuario con la expiración por defecto"""
+    to_encode = {"sub": str(user_id), "exp": int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60}
+    return _jwt.encode(to_encode, _SECRET_BYTES, algorithm=ALGORITHM)
+
+
+def _decode_token(token: str) -> Optional[tuple[int, float]]:
+    """Verificar firma y claims del token; devuelve (user_id, exp) o None"""
+    # Descartar tokens mal formados antes de pagar la verificación HMAC
+    if token.count(".") != 2:
+        return None
+    
+    # algorithms=[ALGORITHM] rechaza cualquier otro "alg" del header
+    try:
+        payload = _jwt.decode(token, _SECRET_BYTES, algorithms=[ALGORITHM])
+        sub = payload.get("sub")
+        
+        if sub is None:
+            return None
+        
+        user_id = int(sub) if isinstance(sub, str) else sub
+    
+    except (jwt.InvalidTokenError, ValueError):
+        return None
+    
+    exp = payload.get("exp")
+    return user_id, float(exp) if exp is not None else float("inf")
+
+
 def verify_token(token: str) -> Optional[int]:
     """
     Verificar y decodificar token JWT
@@ -74,23 +227,82 @@ def verify_token(token: str) -> Optional[int]:
     Returns:
         user_id si el token es válido, None si no
     """
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        
-        if user_id is None:
+    decoded = _decode_token(token)
+    return decoded[0] if decoded is not None else None
+
+
+def _load_auth_user_row(db: Session, user_id: int):
+    """Columnas públicas del usuario, o None si no existe"""
+    return db.execute(
+        select(*_AUTH_USER_COLUMNS).where(models.User.id == user_id)
+    ).first()
+
+
+async def resolve_token(token: str, db: Session) -> Optional[AuthUser]:
+    """
+    Resolver un token al usuario autenticado
+    
+    Verificación del token y carga del usuario comparten un único cache LRU por
+    token: en el caso común basta una búsqueda y una comparación de tiempo. Al
+    vencer el TTL del usuario solo se relee la BD (sin repetir la verificación
+    HMAC), y un token expirado se rechaza sin volver a decodificarlo. Esa lectura
+    corre en un hilo aparte para no bloquear el event loop.
+    
+    Args:
+        token: Token JWT
+        db: Sesión de base de datos
+    
+    Returns:
+        AuthUser si el token es válido y el usuario existe, None si no
+    """
+    now = time.time()
+    with _auth_cache_lock:
+        cached = _auth_cache.get(token)
+        if cached is not None:
+            if now < cached[1]:
+                _auth_cache.move_to_end(token)
+                return cached[0]
+            if now >= cached[2]:
+                del _auth_cache[token]
+                return None
+    
+    if cached is not None:
+        user_id, token_exp = cached[0].id, cached[2]
+    else:
+        decoded = _decode_token(token)
+        if decoded is None:
             return None
-        
-        return int(user_id)
+        user_id, token_exp = decoded
+    
+    row = await anyio.to_thread.run_sync(_load_auth_user_row, db, user_id)
     
-    except JWTError:
+    if row is None:
+        with _auth_cache_lock:
+            _auth_cache.pop(token, None)
         return None
+    
+    user = AuthUser(*row)
+    with _auth_cache_lock:
+        _auth_cache[token] = (user, min(token_exp, now + AUTH_CACHE_TTL_SECONDS), token_exp)
+        _auth_cache.move_to_end(token)
+        if len(_auth_cache) > AUTH_CACHE_MAX_SIZE:
+            _auth_cache.popitem(last=False)
+    
+    return user
+
+
+def invalidate_user(user_id: int) -> None:
+    """Descartar el usuario cacheado en todos sus tokens (llamar tras modificar sus datos)"""
+    with _auth_cache_lock:
+        stale = [token for token, cached in _auth_cache.items() if cached[0].id == user_id]
+        for token in stale:
+            del _auth_cache[token]
 
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> models.User:
+) -> AuthUser:
     """
     Obtener usuario actual desde el token JWT
     
@@ -104,21 +316,14 @@ async def get_current_user(
     Raises:
         HTTPException: Si el token no es válido o el usuario no existe
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudo validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    user_id = verify_token(token)
-    
-    if user_id is None:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await resolve_token(token, db)
     
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudo validar las credenciales",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
     if not user.is_active:
         raise HTTPException(
@@ -129,10 +334,34 @@ async def get_current_user(
     return user
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
+def _load_credentials(db: Session, email: str):
+    """Fila (hashed_password, columnas públicas) del usuario con ese email, o None"""
+    return db.execute(
+        select(models.User.hashed_password, *_AUTH_USER_COLUMNS)
+        .where(models.User.email.in_(email_lookup_keys(email)))
+        .order_by(email_lookup_order(email))
+        .limit(1)
+    ).first()
+
+
+def _rehash_password(db: Session, user_id: int, password: str) -> None:
+    """Guardar un hash nuevo de la contraseña (Argon2id con los parámetros actuales)"""
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(hashed_password=get_password_hash(password))
+    )
+    db.commit()
+
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[AuthUser]:
     """
     Autenticar usuario con email y contraseña
     
+    Si el hash guardado es bcrypt (o Argon2 con parámetros antiguos) se
+    reemplaza por uno nuevo tras un login correcto. Las consultas a la BD y los
+    hashes corren en hilos aparte para no bloquear el event loop.
+    
     Args:
         db: Sesión de base de datos
         email: Email del usuario
@@ -141,12 +370,20 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
     Returns:
         Usuario si las credenciales son correctas, None si no
     """
-    user = db.query(models.User).filter(models.User.email == email).first()
+    row = await anyio.to_thread.run_sync(_load_credentials, db, email)
     
-    if not user:
+    if row is None:
+        # Verificar igual contra un hash falso para no revelar qué emails existen
+        await verify_password_async(password, _DUMMY_HASH)
         return None
     
-    if not verify_password(password, user.hashed_password):
+    hashed_password, *user_fields = row
+    if not await verify_password_async(password, hashed_password):
         return None
     
+    user = AuthUser(*user_fields)
+    
+    if password_needs_rehash(hashed_password):
+        await anyio.to_thread.run_sync(_rehash_password, db, user.id, password)
+    
     return user
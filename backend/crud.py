@@ -1,29 +1,219 @@
 """
 Operaciones CRUD (Create, Read, Update, Delete) para todos los modelos
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, extract, func
-from typing import List, Optional
+from __future__ import annotations
+
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO, TextIOWrapper
+from operator import itemgetter
+from charset_normalizer import from_bytes
+from sqlalchemy.orm import Session, joinedload, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import Float, Numeric, and_, case, cast, delete, inspect, exists, extract, func, insert, lambda_stmt, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from typing import Iterable, Iterator, List, Optional, Tuple
 from datetime import date, datetime, timedelta
 from . import models, schemas
-from .auth import get_password_hash
+from .database import DEBUG
+from .auth import email_lookup_keys, email_lookup_order, get_password_hash, normalize_email
+import ahocorasick
 import calendar
+import codecs
+import copy
+import csv
+import heapq
+import numbers
+import os
+import re
+import threading
+import time
+
+# Cache de agregados (gasto por presupuesto, resumen mensual, tendencias) por
+# usuario. Las claves de un solo mes terminan en (año, mes): cada escritura de
+# transacciones descarta solo los meses afectados; las que abarcan varios meses
+# se descartan en cualquier escritura. El TTL acota el desfase cuando otro
+# proceso (otro worker) escribe en la BD.
+AGGREGATE_CACHE_MAX_SIZE = 1024
+AGGREGATE_CACHE_TTL_SECONDS = int(os.getenv("AGGREGATE_CACHE_TTL_SECONDS", "60"))
+_aggregate_cache: "OrderedDict[tuple, tuple[object, float]]" = OrderedDict()
+_aggregate_cache_lock = threading.Lock()
+_MONTH_SCOPED_AGGREGATES = frozenset({"spent", "summary"})
+
+# True cuando la BD tiene el índice único de presupuestos (lo fija main al
+# arrancar con database.ensure_budget_unique_index)
+BUDGET_UNIQUE_INDEX = False
+
+
+@lru_cache(maxsize=256)
+def _last_day(year: int, month: int) -> int:
+    """Último día del mes"""
+    return calendar.monthrange(year, month)[1]
+
+
+@lru_cache(maxsize=12)
+def _month_abbr(month: int) -> str:
+    """Nombre abreviado del mes (calendar.month_name se formatea en cada acceso)"""
+    return calendar.month_name[month][:3]
+
+
+@lru_cache(maxsize=256)
+def _month_bounds(year: int, month: int) -> tuple[date, date]:
+    """Primer día del mes y primer día del mes siguiente (rango semiabierto para filtrar por fecha)"""
+    return date(year, month, 1), date(year + (month == 12), month % 12 + 1, 1)
+
+
+def _round_money(expr):
+    """
+    Redondear a 2 decimales en la BD
+    
+    PostgreSQL solo tiene round(numeric, int): se pasa por NUMERIC y se vuelve
+    a FLOAT para que el resultado llegue como float igual que en SQLite.
+    """
+    return cast(func.round(cast(expr, Numeric), 2), Float)
+
+
+def _aggregate_cache_get(key: tuple):
+    """Leer un agregado cacheado (None si no está o ya venció)"""
+    with _aggregate_cache_lock:
+        cached = _aggregate_cache.get(key)
+        if cached is None:
+            return None
+        
+        value, expires_at = cached
+        if time.monotonic() >= expires_at:
+            del _aggregate_cache[key]
+            return None
+        
+        _aggregate_cache.move_to_end(key)
+        return value
+
+
+def _aggregate_cache_put(key: tuple, value) -> None:
+    """Guardar un agregado en el cache, descartando el más antiguo si está lleno"""
+    with _aggregate_cache_lock:
+        _aggregate_cache[key] = (value, time.monotonic() + AGGREGATE_CACHE_TTL_SECONDS)
+        _aggregate_cache.move_to_end(key)
+        if len(_aggregate_cache) > AGGREGATE_CACHE_MAX_SIZE:
+            _aggregate_cache.popitem(last=False)
+
+
+def invalidate_aggregates(user_id: int, dates: Optional[Iterable[date]] = None) -> None:
+    """
+    Descartar los agregados cacheados del usuario (llamar tras escribir transacciones)
+    
+    Con `dates` solo se descartan los meses de esas fechas (en una actualización,
+    la fecha anterior y la nueva); sin `dates`, todos los del usuario.
+    """
+    months = None if dates is None else {(d.year, d.month) for d in dates}
+    with _aggregate_cache_lock:
+        stale = [
+            key for key in _aggregate_cache
+            if key[1] == user_id and (
+                months is None
+                or key[0] not in _MONTH_SCOPED_AGGREGATES
+                or key[-2:] in months
+            )
+        ]
+        for key in stale:
+            del _aggregate_cache[key]
+
+
+# Categorías creadas para cada usuario nuevo
+_DEFAULT_CATEGORIES: tuple[dict, ...] = (
+    {"name": "Vivienda", "icon": "🏠", "color": "#e74c3c", "is_active": True},
+    {"name": "Servicios", "icon": "⚡", "color": "#3498db", "is_active": True},
+    {"name": "Transporte", "icon": "🚗", "color": "#9b59b6", "is_active": True},
+    {"name": "Alimentación", "icon": "🍔", "color": "#e67e22", "is_active": True},
+    {"name": "Salud", "icon": "🏥", "color": "#1abc9c", "is_active": True},
+    {"name": "Entretenimiento", "icon": "🎮", "color": "#f39c12", "is_active": True},
+    {"name": "Educación", "icon": "📚", "color": "#2ecc71", "is_active": True},
+    {"name": "Otros", "icon": "📦", "color": "#95a5a6", "is_active": True},
+)
+
+
+def _get_owned(db: Session, model, obj_id: int, user_id: int, options: tuple = ()):
+    """
+    Buscar por clave primaria y verificar que pertenece al usuario
+    
+    Session.get consulta primero el identity map: si la fila ya se cargó en la
+    sesión (p. ej. validaciones previas del mismo request) no se emite SQL.
+    `options` son opciones de carga (joinedload...) para la consulta.
+    """
+    obj = db.get(model, obj_id, options=options)
+    return obj if obj is not None and obj.user_id == user_id else None
+
+
+def _update_owned(db: Session, model, obj_id: int, user_id: int, update_data: dict):
+    """
+    Actualizar una fila del usuario y devolverla (None si no existe o es de otro usuario)
+    
+    UPDATE ... RETURNING: una sola sentencia en vez de SELECT + UPDATE + refresh.
+    Sin datos que cambiar devuelve la fila actual.
+    """
+    if not update_data:
+        return _get_owned(db, model, obj_id, user_id)
+    
+    obj = db.execute(
+        update(model)
+        .where(model.id == obj_id, model.user_id == user_id)
+        .values(**update_data)
+        .returning(model)
+    ).scalar_one_or_none()
+    
+    if obj is None:
+        db.rollback()
+        return None
+    
+    return _commit_returning(db, obj)
+
+
+def _commit_returning(db: Session, obj):
+    """
+    Confirmar la transacción conservando los valores que devolvió RETURNING
+    
+    El commit expira la instancia; los valores se restauran como confirmados
+    para que serializar la respuesta no vuelva a leer la fila.
+    """
+    returned = {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+    db.commit()
+    for key, value in returned.items():
+        set_committed_value(obj, key, value)
+    return obj
+
+
+def _delete_owned(db: Session, model, obj_id: int, user_id: int, *, commit: bool = True) -> bool:
+    """Eliminar una fila del usuario con un solo DELETE; False si no existía o es de otro usuario"""
+    result = db.execute(
+        delete(model).where(model.id == obj_id, model.user_id == user_id)
+    )
+    if commit:
+        db.commit()
+    return result.rowcount > 0
 
 
 # ========== USER CRUD ==========
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """Obtener usuario por email"""
-    return db.query(models.User).filter(models.User.email == email).first()
+    # La forma normalizada y la original podrían coincidir con dos filas heredadas
+    return db.execute(
+        select(models.User)
+        .where(models.User.email.in_(email_lookup_keys(email)))
+        .order_by(email_lookup_order(email))
+        .limit(1)
+    ).scalar_one_or_none()
 
 
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     """Obtener usuario por username"""
-    return db.query(models.User).filter(models.User.username == username).first()
+    return db.execute(
+        select(models.User).where(models.User.username == username)
+    ).scalar_one_or_none()
 
 
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
     """Obtener usuario por ID"""
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return db.get(models.User, user_id)
 
 
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
@@ -31,53 +221,48 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     hashed_password = get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
-        email=user.email,
+        email=normalize_email(user.email),
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db.flush()  # Obtener db_user.id sin cerrar la transacción
     
-    # Crear categorías por defecto
-    default_categories = [
-        {"name": "Vivienda", "icon": "🏠", "color": "#e74c3c"},
-        {"name": "Servicios", "icon": "⚡", "color": "#3498db"},
-        {"name": "Transporte", "icon": "🚗", "color": "#9b59b6"},
-        {"name": "Alimentación", "icon": "🍔", "color": "#e67e22"},
-        {"name": "Salud", "icon": "🏥", "color": "#1abc9c"},
-        {"name": "Entretenimiento", "icon": "🎮", "color": "#f39c12"},
-        {"name": "Educación", "icon": "📚", "color": "#2ecc71"},
-        {"name": "Otros", "icon": "📦", "color": "#95a5a6"},
-    ]
-    
-    for cat_data in default_categories:
-        db_category = models.Category(
-            user_id=db_user.id,
-            **cat_data
-        )
-        db.add(db_category)
+    # Crear categorías por defecto: un único INSERT por lotes, en la misma transacción que el usuario
+    db.execute(
+        insert(models.Category),
+        [{**cat_data, "user_id": db_user.id} for cat_data in _DEFAULT_CATEGORIES]
+    )
     
     db.commit()
+    db.refresh(db_user)
     return db_user
 
 
 def update_user(db: Session, user_id: int, user: schemas.UserUpdate) -> Optional[models.User]:
     """Actualizar usuario"""
-    db_user = get_user(db, user_id)
-    if not db_user:
-        return None
-    
     update_data = user.model_dump(exclude_unset=True)
+    if not update_data:
+        return get_user(db, user_id)
     
     if "password" in update_data:
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
     
-    for key, value in update_data.items():
-        setattr(db_user, key, value)
+    if update_data.get("email"):
+        update_data["email"] = normalize_email(update_data["email"])
     
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    # UPDATE ... RETURNING: una sola sentencia en vez de SELECT + UPDATE + refresh
+    db_user = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(**update_data)
+        .returning(models.User)
+    ).scalar_one_or_none()
+    
+    if not db_user:
+        db.rollback()
+        return None
+    
+    return _commit_returning(db, db_user)
 
 
 # ========== CATEGORY CRUD ==========
@@ -91,10 +276,7 @@ def get_categories(db: Session, user_id: int, include_inactive: bool = False) ->
 
 def get_category(db: Session, category_id: int, user_id: int) -> Optional[models.Category]:
     """Obtener categoría por ID (verificando que pertenece al usuario)"""
-    return db.query(models.Category).filter(
-        models.Category.id == category_id,
-        models.Category.user_id == user_id
-    ).first()
+    return _get_owned(db, models.Category, category_id, user_id)
 
 
 def create_category(db: Session, category: schemas.CategoryCreate, user_id: int) -> models.Category:
@@ -111,45 +293,35 @@ def create_category(db: Session, category: schemas.CategoryCreate, user_id: int)
 
 def update_category(db: Session, category_id: int, category: schemas.CategoryUpdate, user_id: int) -> Optional[models.Category]:
     """Actualizar categoría"""
-    db_category = get_category(db, category_id, user_id)
-    if not db_category:
-        return None
-    
-    update_data = category.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_category, key, value)
-    
-    db.commit()
-    db.refresh(db_category)
+    db_category = _update_owned(db, models.Category, category_id, user_id, category.model_dump(exclude_unset=True))
+    if db_category is not None:
+        invalidate_aggregates(user_id)  # El resumen mensual incluye nombre, icono y color
     return db_category
 
 
 def delete_category(db: Session, category_id: int, user_id: int) -> bool:
     """Eliminar categoría (soft delete)"""
-    db_category = get_category(db, category_id, user_id)
-    if not db_category:
-        return False
-    
     # Verificar si tiene transacciones o presupuestos asociados
-    has_transactions = db.query(models.Transaction).filter(
-        models.Transaction.category_id == category_id
-    ).first() is not None
+    has_related = or_(
+        exists().where(models.Transaction.category_id == category_id),
+        exists().where(models.Budget.category_id == category_id)
+    )
+    owned = and_(models.Category.id == category_id, models.Category.user_id == user_id)
     
-    if has_transactions:
-        # Soft delete: marcar como inactiva
-        db_category.is_active = False
-        db.commit()
-    else:
+    # Soft delete: marcar como inactiva (la condición va en el mismo UPDATE)
+    result = db.execute(
+        update(models.Category).where(owned, has_related).values(is_active=False)
+    )
+    if result.rowcount == 0:
         # Hard delete si no tiene datos asociados
-        db.delete(db_category)
-        db.commit()
+        result = db.execute(delete(models.Category).where(owned, ~has_related))
     
-    return True
+    db.commit()
+    return result.rowcount > 0
 
 
 # ========== TRANSACTION CRUD ==========
-def get_transactions(
-    db: Session,
+def _transactions_query(
     user_id: int,
     category_id: Optional[int] = None,
     type: Optional[str] = None,
@@ -157,43 +329,110 @@ def get_transactions(
     end_date: Optional[date] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
-    search_text: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100
-) -> List[models.Transaction]:
-    """Obtener transacciones con filtros avanzados"""
-    query = db.query(models.Transaction).filter(models.Transaction.user_id == user_id)
+    search_text: Optional[str] = None
+):
+    """
+    Consulta de transacciones con los filtros avanzados, de la más reciente a la más antigua
+    
+    Se arma con lambda_stmt: SQLAlchemy guarda la construcción y el SQL compilado
+    de cada combinación de filtros y los valores pasan como parámetros, así que las
+    llamadas repetidas no rearman la expresión.
+    """
+    stmt = lambda_stmt(lambda: select(models.Transaction).where(models.Transaction.user_id == user_id))
     
     if category_id:
-        query = query.filter(models.Transaction.category_id == category_id)
+        stmt += lambda s: s.where(models.Transaction.category_id == category_id)
     
     if type:
-        query = query.filter(models.Transaction.type == type)
+        stmt += lambda s: s.where(models.Transaction.type == type)
     
     if start_date:
-        query = query.filter(models.Transaction.date >= start_date)
+        stmt += lambda s: s.where(models.Transaction.date >= start_date)
     
     if end_date:
-        query = query.filter(models.Transaction.date <= end_date)
+        stmt += lambda s: s.where(models.Transaction.date <= end_date)
     
     if min_amount is not None:
-        query = query.filter(models.Transaction.amount >= min_amount)
+        stmt += lambda s: s.where(models.Transaction.amount >= min_amount)
     
     if max_amount is not None:
-        query = query.filter(models.Transaction.amount <= max_amount)
+        stmt += lambda s: s.where(models.Transaction.amount <= max_amount)
     
     if search_text:
-        query = query.filter(models.Transaction.description.ilike(f"%{search_text}%"))
+        pattern = f"%{search_text}%"
+        stmt += lambda s: s.where(models.Transaction.description.ilike(pattern))
+    
+    # El id desempata las transacciones del mismo día: orden total para el cursor
+    stmt += lambda s: s.order_by(models.Transaction.date.desc(), models.Transaction.id.desc())
+    return stmt
+
+
+def get_transactions(
+    db: Session,
+    user_id: int,
+    category_id: Optional[int] = None,
+    type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    search_text: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[Tuple[date, int]] = None
+) -> List[models.Transaction]:
+    """
+    Obtener transacciones con filtros avanzados
+    
+    cursor es la clave (date, id) de la última transacción de la página anterior
+    (paginación por clave: el costo no crece con la profundidad de la página).
+    skip se mantiene por compatibilidad y se ignora si hay cursor.
+    """
+    stmt = _transactions_query(
+        user_id, category_id, type, start_date, end_date, min_amount, max_amount, search_text
+    )
+    if cursor is not None:
+        cursor_date, cursor_id = cursor
+        stmt += lambda s: s.where(
+            tuple_(models.Transaction.date, models.Transaction.id) < tuple_(cursor_date, cursor_id)
+        )
+    elif skip:
+        stmt += lambda s: s.offset(skip)
+    stmt += lambda s: s.limit(limit)
+    return db.scalars(stmt).all()
+
+
+def get_transactions_stream(
+    db: Session,
+    user_id: int,
+    category_id: Optional[int] = None,
+    type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    search_text: Optional[str] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 500
+) -> Iterator[models.Transaction]:
+    """
+    Recorrer transacciones con filtros avanzados sin materializarlas todas
     
-    return query.order_by(models.Transaction.date.desc()).offset(skip).limit(limit).all()
+    Pensado para exportaciones: las filas se leen en lotes de batch_size. El
+    generador debe consumirse mientras la sesión siga abierta.
+    """
+    stmt = _transactions_query(
+        user_id, category_id, type, start_date, end_date, min_amount, max_amount, search_text
+    )
+    if limit is not None:
+        stmt += lambda s: s.limit(limit)
+    
+    yield from db.scalars(stmt, execution_options={"yield_per": batch_size})
 
 
 def get_transaction(db: Session, transaction_id: int, user_id: int) -> Optional[models.Transaction]:
     """Obtener transacción por ID"""
-    return db.query(models.Transaction).filter(
-        models.Transaction.id == transaction_id,
-        models.Transaction.user_id == user_id
-    ).first()
+    return _get_owned(db, models.Transaction, transaction_id, user_id)
 
 
 def create_transaction(db: Session, transaction: schemas.TransactionCreate, user_id: int) -> models.Transaction:
@@ -204,55 +443,63 @@ def create_transaction(db: Session, transaction: schemas.TransactionCreate, user
     )
     db.add(db_transaction)
     db.commit()
+    invalidate_aggregates(user_id, [transaction.date])
     db.refresh(db_transaction)
     return db_transaction
 
 
 def update_transaction(db: Session, transaction_id: int, transaction: schemas.TransactionUpdate, user_id: int) -> Optional[models.Transaction]:
     """Actualizar transacción"""
-    db_transaction = get_transaction(db, transaction_id, user_id)
-    if not db_transaction:
-        return None
-    
     update_data = transaction.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_transaction, key, value)
     
-    db.commit()
-    db.refresh(db_transaction)
+    # Si cambia la fecha, el mes anterior también queda desactualizado
+    previous_date = None
+    if "date" in update_data:
+        previous_date = db.scalar(
+            select(models.Transaction.date).where(
+                models.Transaction.id == transaction_id,
+                models.Transaction.user_id == user_id
+            )
+        )
+    
+    db_transaction = _update_owned(db, models.Transaction, transaction_id, user_id, update_data)
+    if db_transaction is not None:
+        invalidate_aggregates(user_id, filter(None, (previous_date, db_transaction.date)))
     return db_transaction
 
 
 def delete_transaction(db: Session, transaction_id: int, user_id: int) -> bool:
     """Eliminar transacción"""
-    db_transaction = get_transaction(db, transaction_id, user_id)
-    if not db_transaction:
+    # RETURNING: la fecha borrada indica qué mes descartar del cache
+    deleted_date = db.execute(
+        delete(models.Transaction)
+        .where(models.Transaction.id == transaction_id, models.Transaction.user_id == user_id)
+        .returning(models.Transaction.date)
+    ).scalar_one_or_none()
+    db.commit()
+    if deleted_date is None:
         return False
     
-    db.delete(db_transaction)
-    db.commit()
+    invalidate_aggregates(user_id, [deleted_date])
     return True
 
 
 # ========== BUDGET CRUD ==========
 def get_budgets(db: Session, user_id: int, month: Optional[int] = None, year: Optional[int] = None) -> List[models.Budget]:
     """Obtener presupuestos del usuario"""
-    query = db.query(models.Budget).filter(models.Budget.user_id == user_id)
+    stmt = lambda_stmt(lambda: select(models.Budget).where(models.Budget.user_id == user_id))
     
     if month:
-        query = query.filter(models.Budget.month == month)
+        stmt += lambda s: s.where(models.Budget.month == month)
     if year:
-        query = query.filter(models.Budget.year == year)
+        stmt += lambda s: s.where(models.Budget.year == year)
     
-    return query.all()
+    return db.scalars(stmt).all()
 
 
 def get_budget(db: Session, budget_id: int, user_id: int) -> Optional[models.Budget]:
     """Obtener presupuesto por ID"""
-    return db.query(models.Budget).filter(
-        models.Budget.id == budget_id,
-        models.Budget.user_id == user_id
-    ).first()
+    return _get_owned(db, models.Budget, budget_id, user_id)
 
 
 def get_budget_by_category_month(db: Session, user_id: int, category_id: int, month: int, year: int) -> Optional[models.Budget]:
@@ -267,9 +514,10 @@ def get_budget_by_category_month(db: Session, user_id: int, category_id: int, mo
 
 def create_budget(db: Session, budget: schemas.BudgetCreate, user_id: int) -> models.Budget:
     """Crear nuevo presupuesto"""
-    # Verificar si ya existe para esta categoría y mes
-    existing = get_budget_by_category_month(db, user_id, budget.category_id, budget.month, budget.year)
-    if existing:
+    # Sin el índice único (BD antigua con duplicados) hay que comprobarlo antes
+    if not BUDGET_UNIQUE_INDEX and get_budget_by_category_month(
+        db, user_id, budget.category_id, budget.month, budget.year
+    ):
         raise ValueError("Ya existe un presupuesto para esta categoría y mes")
     
     db_budget = models.Budget(
@@ -277,84 +525,180 @@ def create_budget(db: Session, budget: schemas.BudgetCreate, user_id: int) -> mo
         user_id=user_id
     )
     db.add(db_budget)
-    db.commit()
+    
+    # El índice único (usuario, categoría, mes, año) detecta el duplicado
+    # sin una consulta previa
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("Ya existe un presupuesto para esta categoría y mes")
+    
     db.refresh(db_budget)
     return db_budget
 
 
 def update_budget(db: Session, budget_id: int, budget: schemas.BudgetUpdate, user_id: int) -> Optional[models.Budget]:
     """Actualizar presupuesto"""
-    db_budget = get_budget(db, budget_id, user_id)
-    if not db_budget:
-        return None
-    
-    update_data = budget.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_budget, key, value)
-    
-    db.commit()
-    db.refresh(db_budget)
-    return db_budget
+    return _update_owned(db, models.Budget, budget_id, user_id, budget.model_dump(exclude_unset=True))
 
 
 def delete_budget(db: Session, budget_id: int, user_id: int) -> bool:
     """Eliminar presupuesto"""
-    db_budget = get_budget(db, budget_id, user_id)
-    if not db_budget:
-        return False
-    
-    db.delete(db_budget)
-    db.commit()
-    return True
+    return _delete_owned(db, models.Budget, budget_id, user_id)
 
 
 def get_budget_status(db: Session, budget_id: int, user_id: int) -> Optional[dict]:
-    """Obtener estado del presupuesto con gasto actual"""
-    db_budget = get_budget(db, budget_id, user_id)
+    """Obtener estado del presupuesto con gasto actual (con su categoría ya cargada)"""
+    db_budget = _get_owned(db, models.Budget, budget_id, user_id, options=(joinedload(models.Budget.category),))
     if not db_budget:
         return None
     
-    # Calcular gasto total en la categoría para el mes
-    start_date = date(db_budget.year, db_budget.month, 1)
-    last_day = calendar.monthrange(db_budget.year, db_budget.month)[1]
-    end_date = date(db_budget.year, db_budget.month, last_day)
+    # Calcular gasto total en la categoría para el mes (cacheado hasta la próxima escritura)
+    cache_key = ("spent", user_id, db_budget.category_id, db_budget.year, db_budget.month)
+    spent = _aggregate_cache_get(cache_key)
     
-    spent = db.query(func.sum(models.Transaction.amount)).filter(
-        models.Transaction.user_id == user_id,
-        models.Transaction.category_id == db_budget.category_id,
-        models.Transaction.type == 2,  # 2 = gasto
-        models.Transaction.date >= start_date,
-        models.Transaction.date <= end_date
-    ).scalar() or 0.0
+    if spent is None:
+        month_start, next_month_start = _month_bounds(db_budget.year, db_budget.month)
+        
+        # COALESCE: sin filas el índice (user_id, category_id, date) devuelve 0.0 directamente
+        spent = db.query(_round_money(func.coalesce(func.sum(models.Transaction.amount), 0.0))).filter(
+            models.Transaction.user_id == user_id,
+            models.Transaction.category_id == db_budget.category_id,
+            models.Transaction.type == 2,  # 2 = gasto
+            models.Transaction.date >= month_start,
+            models.Transaction.date < next_month_start
+        ).scalar()
+        _aggregate_cache_put(cache_key, spent)
     
+    return _budget_status(db_budget, spent)
+
+
+def _budget_status(db_budget: models.Budget, spent: float) -> dict:
+    """Estado de un presupuesto a partir de su gasto del mes"""
     remaining = db_budget.amount - spent
     percentage_used = (spent / db_budget.amount * 100) if db_budget.amount > 0 else 0
     is_exceeded = spent > db_budget.amount
     
     return {
         "budget": db_budget,
-        "spent": round(spent, 2),
+        "spent": spent,
         "remaining": round(remaining, 2),
         "percentage_used": round(percentage_used, 2),
         "is_exceeded": is_exceeded
     }
 
 
+def get_budgets_with_status(
+    db: Session,
+    user_id: int,
+    month: Optional[int] = None,
+    year: Optional[int] = None
+) -> List[dict]:
+    """
+    Obtener presupuestos del usuario con su categoría y gasto del mes
+    
+    Una sola consulta: el gasto se agrupa por (categoría, año, mes) y se une a
+    cada presupuesto, en vez de un SUM por presupuesto. Los gastos quedan en el
+    cache de agregados para GET /budgets/{id}.
+    """
+    year_col = extract('year', models.Transaction.date)
+    month_col = extract('month', models.Transaction.date)
+    spent_stmt = select(
+        models.Transaction.category_id,
+        year_col.label('year'),
+        month_col.label('month'),
+        func.sum(models.Transaction.amount).label('total')
+    ).where(
+        models.Transaction.user_id == user_id,
+        models.Transaction.type == 2  # 2 = gasto
+    ).group_by(models.Transaction.category_id, year_col, month_col)
+    
+    # Acotar por fecha (usa el índice) cuando se pide un mes o un año
+    if month and year:
+        month_start, next_month_start = _month_bounds(year, month)
+        spent_stmt = spent_stmt.where(
+            models.Transaction.date >= month_start,
+            models.Transaction.date < next_month_start
+        )
+    elif year:
+        spent_stmt = spent_stmt.where(
+            models.Transaction.date >= date(year, 1, 1),
+            models.Transaction.date < date(year + 1, 1, 1)
+        )
+    spent_subq = spent_stmt.subquery()
+    
+    stmt = select(
+        models.Budget,
+        _round_money(func.coalesce(spent_subq.c.total, 0.0))
+    ).options(
+        joinedload(models.Budget.category)
+    ).outerjoin(
+        spent_subq,
+        and_(
+            spent_subq.c.category_id == models.Budget.category_id,
+            spent_subq.c.year == models.Budget.year,
+            spent_subq.c.month == models.Budget.month
+        )
+    ).where(models.Budget.user_id == user_id)
+    
+    if month:
+        stmt = stmt.where(models.Budget.month == month)
+    if year:
+        stmt = stmt.where(models.Budget.year == year)
+    
+    statuses = []
+    for db_budget, spent in db.execute(stmt).all():
+        _aggregate_cache_put(
+            ("spent", user_id, db_budget.category_id, db_budget.year, db_budget.month), spent
+        )
+        statuses.append(_budget_status(db_budget, spent))
+    return statuses
+
+
 # ========== REMINDER CRUD ==========
-def get_reminders(db: Session, user_id: int, active_only: bool = True) -> List[models.Reminder]:
-    """Obtener recordatorios del usuario"""
-    query = db.query(models.Reminder).filter(models.Reminder.user_id == user_id)
+def get_reminders(
+    db: Session,
+    user_id: int,
+    active_only: bool = True,
+    load_options: tuple = ()
+) -> List[models.Reminder]:
+    """
+    Obtener recordatorios del usuario
+    
+    `load_options` indica las relaciones que el llamador va a leer (selectinload,
+    joinedload). Con DEBUG activo cualquier otra relación lanza error al accederla,
+    para detectar consultas N+1 durante el desarrollo.
+    """
+    stmt = lambda_stmt(lambda: select(models.Reminder).where(models.Reminder.user_id == user_id))
     if active_only:
-        query = query.filter(models.Reminder.is_active == True)
-    return query.all()
+        stmt += lambda s: s.where(models.Reminder.is_active == True)
+    if load_options:
+        # Las opciones de carga forman parte de la clave de cache del SQL
+        stmt = stmt.add_criteria(lambda s: s.options(*load_options), track_on=[load_options])
+    if DEBUG:
+        stmt += lambda s: s.options(raiseload('*'))
+    return db.scalars(stmt).all()
 
 
 def get_reminder(db: Session, reminder_id: int, user_id: int) -> Optional[models.Reminder]:
     """Obtener recordatorio por ID"""
-    return db.query(models.Reminder).filter(
-        models.Reminder.id == reminder_id,
-        models.Reminder.user_id == user_id
-    ).first()
+    return _get_owned(db, models.Reminder, reminder_id, user_id)
+
+
+def _active_reminders(db: Session, user_id: int) -> List[models.Reminder]:
+    """
+    Recordatorios activos del usuario, memorizados en la sesión
+    
+    Varios cálculos de la misma petición (vencimientos, pendientes) comparten una
+    sola consulta. Las escrituras de recordatorios descartan la memoria.
+    """
+    reminder_cache = db.info.setdefault("reminder_cache", {})
+    reminders = reminder_cache.get(user_id)
+    if reminders is None:
+        reminders = get_reminders(db, user_id, active_only=True)
+        reminder_cache[user_id] = reminders
+    return reminders
 
 
 def create_reminder(db: Session, reminder: schemas.ReminderCreate, user_id: int) -> models.Reminder:
@@ -365,82 +709,68 @@ def create_reminder(db: Session, reminder: schemas.ReminderCreate, user_id: int)
     )
     db.add(db_reminder)
     db.commit()
+    db.info.pop("reminder_cache", None)
     db.refresh(db_reminder)
     return db_reminder
 
 
 def update_reminder(db: Session, reminder_id: int, reminder: schemas.ReminderUpdate, user_id: int) -> Optional[models.Reminder]:
     """Actualizar recordatorio"""
-    db_reminder = get_reminder(db, reminder_id, user_id)
-    if not db_reminder:
-        return None
-    
-    update_data = reminder.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_reminder, key, value)
-    
-    db.commit()
-    db.refresh(db_reminder)
+    db_reminder = _update_owned(db, models.Reminder, reminder_id, user_id, reminder.model_dump(exclude_unset=True))
+    if db_reminder is not None:
+        db.info.pop("reminder_cache", None)
     return db_reminder
 
 
 def delete_reminder(db: Session, reminder_id: int, user_id: int) -> bool:
     """Eliminar recordatorio"""
-    db_reminder = get_reminder(db, reminder_id, user_id)
-    if not db_reminder:
+    if not _delete_owned(db, models.Reminder, reminder_id, user_id):
         return False
     
-    db.delete(db_reminder)
-    db.commit()
+    db.info.pop("reminder_cache", None)
     return True
 
 
-def mark_reminder_as_paid(db: Session, reminder_id: int, user_id: int, paid_date: date) -> Optional[models.Reminder]:
-    """Marcar recordatorio como pagado"""
-    db_reminder = get_reminder(db, reminder_id, user_id)
-    if not db_reminder:
-        return None
+def get_due_reminders(
+    db: Session,
+    user_id: int,
+    reference_date: date = None,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """
+    Obtener recordatorios próximos a vencer o vencidos
     
-    db_reminder.last_paid_date = paid_date
-    db.commit()
-    db.refresh(db_reminder)
-    return db_reminder
-
-
-def get_due_reminders(db: Session, user_id: int, reference_date: date = None) -> List[dict]:
-    """Obtener recordatorios próximos a vencer o vencidos"""
+    Con `limit` devuelve solo los `limit` más próximos (heapq.nsmallest, sin
+    ordenar la lista completa).
+    """
     if reference_date is None:
         reference_date = date.today()
     
-    reminders = get_reminders(db, user_id, active_only=True)
+    reminders = _active_reminders(db, user_id)
     due_reminders = []
     
+    # Datos del mes actual y del siguiente, calculados una sola vez
+    current_year, current_month = reference_date.year, reference_date.month
+    current_last_day = _last_day(current_year, current_month)
+    next_month = current_month + 1 if current_month < 12 else 1
+    next_year = current_year if current_month < 12 else current_year + 1
+    next_last_day = _last_day(next_year, next_month)
+    
     for reminder in reminders:
-        # Calcular próximo vencimiento
-        try:
-            due_date = date(reference_date.year, reference_date.month, reminder.due_day)
-        except ValueError:
-            # Día inválido para el mes actual
-            last_day = calendar.monthrange(reference_date.year, reference_date.month)[1]
-            due_date = date(reference_date.year, reference_date.month, min(reminder.due_day, last_day))
+        # Calcular próximo vencimiento (días inválidos se ajustan al último día del mes)
+        due_date = date(current_year, current_month, min(reminder.due_day, current_last_day))
         
         # Si ya pasó este mes, calcular para el próximo mes
         if due_date < reference_date:
-            next_month = reference_date.month + 1 if reference_date.month < 12 else 1
-            next_year = reference_date.year if reference_date.month < 12 else reference_date.year + 1
-            try:
-                due_date = date(next_year, next_month, reminder.due_day)
-            except ValueError:
-                last_day = calendar.monthrange(next_year, next_month)[1]
-                due_date = date(next_year, next_month, min(reminder.due_day, last_day))
+            due_date = date(next_year, next_month, min(reminder.due_day, next_last_day))
         
         # Verificar si ya se pagó este mes
-        already_paid = False
-        if reminder.last_paid_date:
-            already_paid = (
-                reminder.last_paid_date.year == reference_date.year and
-                reminder.last_paid_date.month == reference_date.month
-            )
+        last_paid = reminder.last_paid_date
+        already_paid = (
+            last_paid is not None and
+            last_paid.year == current_year and
+            last_paid.month == current_month
+        )
         
         days_until_due = (due_date - reference_date).days
         is_due = days_until_due <= 5 and not already_paid  # Alertar 5 días antes
@@ -454,65 +784,57 @@ def get_due_reminders(db: Session, user_id: int, reference_date: date = None) ->
         })
     
     # Ordenar por días hasta vencimiento
-    due_reminders.sort(key=lambda x: x["days_until_due"])
-    
-    return due_reminders
+    by_days = itemgetter("days_until_due")
+    if limit:
+        return heapq.nsmallest(limit, due_reminders, key=by_days)
+    return sorted(due_reminders, key=by_days)
 
 
 # ========== STATISTICS ==========
 def get_monthly_summary(db: Session, user_id: int, month: int, year: int) -> dict:
     """Obtener resumen mensual de ingresos y gastos"""
-    start_date = date(year, month, 1)
-    last_day = calendar.monthrange(year, month)[1]
-    end_date = date(year, month, last_day)
+    cache_key = ("summary", user_id, year, month)
+    cached = _aggregate_cache_get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
     
-    # Total ingresos
-    total_income = db.query(func.sum(models.Transaction.amount)).filter(
-        models.Transaction.user_id == user_id,
-        models.Transaction.type == 1,  # 1 = ingreso
-        models.Transaction.date >= start_date,
-        models.Transaction.date <= end_date
-    ).scalar() or 0.0
+    month_start, next_month_start = _month_bounds(year, month)
     
-    # Total gastos
-    total_expenses = db.query(func.sum(models.Transaction.amount)).filter(
-        models.Transaction.user_id == user_id,
-        models.Transaction.type == 2,  # 2 = gasto
-        models.Transaction.date >= start_date,
-        models.Transaction.date <= end_date
-    ).scalar() or 0.0
-    
-    # Gastos por categoría
-    categories_expenses = db.query(
+    # Una sola consulta: ingresos y gastos por categoría con agregación condicional
+    is_income = models.Transaction.type == 1  # 1 = ingreso
+    is_expense = models.Transaction.type == 2  # 2 = gasto
+    stmt = select(
         models.Category.name,
         models.Category.icon,
         models.Category.color,
-        func.sum(models.Transaction.amount).label('total')
+        func.coalesce(func.sum(case((is_income, models.Transaction.amount), else_=0)), 0.0),
+        func.coalesce(func.sum(case((is_expense, models.Transaction.amount), else_=0)), 0.0),
+        func.sum(case((is_expense, 1), else_=0)),
+        _round_money(func.sum(case((is_expense, models.Transaction.amount), else_=0)))
     ).join(
         models.Transaction,
         models.Transaction.category_id == models.Category.id
-    ).filter(
+    ).where(
         models.Transaction.user_id == user_id,
-        models.Transaction.type == 2,  # 2 = gasto
-        models.Transaction.date >= start_date,
-        models.Transaction.date <= end_date
-    ).group_by(
-        models.Category.id,
-        models.Category.name,
-        models.Category.icon,
-        models.Category.color
-    ).all()
-    
-    # Convertir lista a diccionario
-    categories_dict = {}
-    for cat in categories_expenses:
-        categories_dict[cat.name] = {
-            "icon": cat.icon,
-            "color": cat.color,
-            "total": round(cat.total, 2)
-        }
+        models.Transaction.date >= month_start,
+        models.Transaction.date < next_month_start
+    ).group_by(models.Category.id)
+    
+    # Filas como tuplas planas (name, icon, color, income, expenses, expense_count,
+    # expenses redondeado en la BD para el detalle por categoría)
+    rows = db.execute(stmt).tuples().all()
+    
+    total_income = float(sum(row[3] for row in rows))
+    total_expenses = float(sum(row[4] for row in rows))
+    
+    # Solo categorías con gastos en el mes
+    categories_dict = {
+        name: {"icon": icon, "color": color, "total": category_total}
+        for name, icon, color, _, _, expense_count, category_total in rows
+        if expense_count
+    }
     
-    return {
+    summary = {
         "month": month,
         "year": year,
         "total_income": round(total_income, 2),
@@ -520,6 +842,8 @@ def get_monthly_summary(db: Session, user_id: int, month: int, year: int) -> dic
         "balance": round(total_income - total_expenses, 2),
         "categories_expenses": categories_dict
     }
+    _aggregate_cache_put(cache_key, summary)
+    return copy.deepcopy(summary)
 
 
 # ========== LEGACY CRUD (mantener compatibilidad) ==========
@@ -542,32 +866,34 @@ def get_bills(db: Session, skip: int = 0, limit: int = 100, activo: Optional[boo
 
 def get_bill(db: Session, bill_id: int) -> Optional[models.Bill]:
     """Obtener una bill por ID"""
-    return db.query(models.Bill).filter(models.Bill.id == bill_id).first()
+    return db.get(models.Bill, bill_id)
 
 
 def update_bill(db: Session, bill_id: int, bill: schemas.BillUpdate) -> Optional[models.Bill]:
     """Actualizar una bill"""
-    db_bill = get_bill(db, bill_id)
+    update_data = bill.model_dump(exclude_unset=True)
+    if not update_data:
+        return get_bill(db, bill_id)
+    
+    db_bill = db.execute(
+        update(models.Bill)
+        .where(models.Bill.id == bill_id)
+        .values(**update_data)
+        .returning(models.Bill)
+    ).scalar_one_or_none()
+    
     if not db_bill:
+        db.rollback()
         return None
     
-    update_data = bill.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_bill, key, value)
-    
-    db.commit()
-    db.refresh(db_bill)
-    return db_bill
+    return _commit_returning(db, db_bill)
 
 
 def delete_bill(db: Session, bill_id: int) -> bool:
     """Eliminar una bill"""
-    db_bill = get_bill(db, bill_id)
-    if not db_bill:
-        return False
-    db.delete(db_bill)
+    result = db.execute(delete(models.Bill).where(models.Bill.id == bill_id))
     db.commit()
-    return True
+    return result.rowcount > 0
 
 
 def create_pago(db: Session, pago: schemas.PagoCreate) -> models.Pago:
@@ -587,21 +913,27 @@ def get_pagos(db: Session, bill_id: Optional[int] = None, mes: Optional[int] = N
         query = query.filter(models.Pago.bill_id == bill_id)
     
     if mes and anio:
+        month_start, next_month_start = _month_bounds(anio, mes)
         query = query.filter(
             and_(
-                extract('month', models.Pago.fecha_pago) == mes,
-                extract('year', models.Pago.fecha_pago) == anio
+                models.Pago.fecha_pago >= month_start,
+                models.Pago.fecha_pago < next_month_start
             )
         )
     elif anio:
-        query = query.filter(extract('year', models.Pago.fecha_pago) == anio)
+        query = query.filter(
+            and_(
+                models.Pago.fecha_pago >= date(anio, 1, 1),
+                models.Pago.fecha_pago < date(anio + 1, 1, 1)
+            )
+        )
     
     return query.all()
 
 
 def get_pago(db: Session, pago_id: int) -> Optional[models.Pago]:
     """Obtener un pago por ID"""
-    return db.query(models.Pago).filter(models.Pago.id == pago_id).first()
+    return db.get(models.Pago, pago_id)
 
 
 def create_presupuesto(db: Session, presupuesto: schemas.PresupuestoCreate) -> models.Presupuesto:
@@ -629,32 +961,25 @@ def get_presupuestos(db: Session, mes: Optional[int] = None, anio: Optional[int]
 def get_pending_reminders(db: Session, user_id: int, days_ahead: int = 7) -> List[dict]:
     """Obtener recordatorios próximos a vencer"""
     today = date.today()
-    reminders = db.query(models.Reminder).filter(
-        models.Reminder.user_id == user_id,
-        models.Reminder.is_active == True
-    ).all()
+    reminders = _active_reminders(db, user_id)
+    
+    # Mes actual y siguiente con su último día, calculados una sola vez
+    current_period = (today.year, today.month, _last_day(today.year, today.month))
+    next_year = today.year + (today.month == 12)
+    next_month = today.month % 12 + 1
+    next_period = (next_year, next_month, _last_day(next_year, next_month))
     
     pending = []
     for reminder in reminders:
-        # Calcular próxima fecha de vencimiento
-        current_month = today.month
-        current_year = today.year
-        
         # Si el día ya pasó este mes, calcular para el próximo periodo
-        if today.day > reminder.due_day:
-            if reminder.frequency == 1:  # mensual
-                current_month += 1
-                if current_month > 12:
-                    current_month = 1
-                    current_year += 1
+        if today.day > reminder.due_day and reminder.frequency == 1:  # mensual
+            year, month, last_day = next_period
+        else:
+            year, month, last_day = current_period
         
-        # Crear fecha de vencimiento
-        try:
-            due_date = date(current_year, current_month, reminder.due_day)
-        except ValueError:
-            # Si el día no existe en el mes (ej: 31 en febrero), usar último día del mes
-            last_day = calendar.monthrange(current_year, current_month)[1]
-            due_date = date(current_year, current_month, last_day)
+        # Crear fecha de vencimiento (si el día no existe en el mes, ej: 31 en febrero,
+        # usar el último día del mes)
+        due_date = date(year, month, min(reminder.due_day, last_day))
         
         # Verificar si está dentro del rango de días
         days_until_due = (due_date - today).days
@@ -680,44 +1005,62 @@ def get_pending_reminders(db: Session, user_id: int, days_ahead: int = 7) -> Lis
 
 def get_budget_alerts(db: Session, user_id: int, month: int, year: int) -> List[dict]:
     """Obtener alertas de presupuestos excedidos o cerca del límite"""
-    budgets = db.query(models.Budget).filter(
-        models.Budget.user_id == user_id,
-        models.Budget.month == month,
-        models.Budget.year == year
-    ).all()
+    month_start, next_month_start = _month_bounds(year, month)
     
-    alerts = []
-    for budget in budgets:
-        # Calcular gasto actual de la categoría en el mes
-        total_spent = db.query(func.sum(models.Transaction.amount)).filter(
-            models.Transaction.user_id == user_id,
-            models.Transaction.category_id == budget.category_id,
-            models.Transaction.type == 2,  # gastos
-            extract('month', models.Transaction.date) == month,
-            extract('year', models.Transaction.date) == year
-        ).scalar() or 0
-        
-        # Calcular porcentaje usado
-        percentage_used = (total_spent / budget.amount * 100) if budget.amount > 0 else 0
-        
-        # Crear alerta si supera el threshold o el 100%
-        if percentage_used >= (budget.alert_threshold * 100):
-            category = db.query(models.Category).filter(models.Category.id == budget.category_id).first()
-            
-            status = "warning" if percentage_used < 100 else "danger"
-            
-            alerts.append({
-                "budget_id": budget.id,
-                "category_name": category.name if category else "Desconocido",
-                "category_icon": category.icon if category else "📦",
-                "budget_amount": budget.amount,
-                "spent_amount": total_spent,
-                "percentage_used": round(percentage_used, 1),
-                "remaining": budget.amount - total_spent,
-                "status": status
-            })
+    # Gasto del mes por categoría, calculado una sola vez
+    spent_subq = db.query(
+        models.Transaction.category_id,
+        func.sum(models.Transaction.amount).label('total')
+    ).filter(
+        models.Transaction.user_id == user_id,
+        models.Transaction.type == 2,  # gastos
+        models.Transaction.date >= month_start,
+        models.Transaction.date < next_month_start
+    ).group_by(models.Transaction.category_id).subquery()
+    
+    # Porcentaje usado y estado calculados en la misma consulta
+    spent = func.coalesce(spent_subq.c.total, 0)
+    percentage_used = case(
+        (models.Budget.amount > 0, spent * 100.0 / models.Budget.amount),
+        else_=0
+    )
+    status = case((percentage_used < 100, "warning"), else_="danger")
     
-    return sorted(alerts, key=lambda x: x["percentage_used"], reverse=True)
+    rows = db.query(
+        models.Budget.id,
+        models.Budget.amount,
+        models.Category.name,
+        models.Category.icon,
+        spent.label('spent'),
+        percentage_used.label('percentage_used'),
+        status.label('status')
+    ).outerjoin(
+        models.Category,
+        models.Budget.category_id == models.Category.id
+    ).outerjoin(
+        spent_subq,
+        spent_subq.c.category_id == models.Budget.category_id
+    ).filter(
+        models.Budget.user_id == user_id,
+        models.Budget.month == month,
+        models.Budget.year == year,
+        # Solo presupuestos que superan el threshold o el 100%
+        percentage_used >= models.Budget.alert_threshold * 100
+    ).order_by(percentage_used.desc()).all()
+    
+    return [
+        {
+            "budget_id": row.id,
+            "category_name": row.name if row.name is not None else "Desconocido",
+            "category_icon": row.icon if row.name is not None else "📦",
+            "budget_amount": row.amount,
+            "spent_amount": row.spent,
+            "percentage_used": round(row.percentage_used, 1),
+            "remaining": row.amount - row.spent,
+            "status": row.status
+        }
+        for row in rows
+    ]
 
 
 def mark_reminder_as_paid(
@@ -725,20 +1068,29 @@ def mark_reminder_as_paid(
     reminder_id: int,
     user_id: int,
     payment_date: date,
-    category_id: int
-) -> tuple[models.Reminder, models.Transaction]:
-    """Marcar recordatorio como pagado y crear transacción automática"""
-    # Obtener recordatorio
-    reminder = db.query(models.Reminder).filter(
-        models.Reminder.id == reminder_id,
-        models.Reminder.user_id == user_id
-    ).first()
+    category_id: Optional[int] = None
+) -> tuple[Optional[models.Reminder], Optional[models.Transaction]]:
+    """
+    Marcar recordatorio como pagado
+    
+    Si se indica category_id también se crea la transacción de gasto correspondiente.
+    """
+    # Actualizar fecha de último pago y obtener el recordatorio en una sola sentencia
+    reminder = db.execute(
+        update(models.Reminder)
+        .where(models.Reminder.id == reminder_id, models.Reminder.user_id == user_id)
+        .values(last_paid_date=payment_date)
+        .returning(models.Reminder)
+    ).scalar_one_or_none()
     
     if not reminder:
+        db.rollback()
         return None, None
     
-    # Actualizar fecha de último pago
-    reminder.last_paid_date = payment_date
+    if category_id is None:
+        _commit_returning(db, reminder)
+        db.info.pop("reminder_cache", None)
+        return reminder, None
     
     # Crear transacción automática
     transaction = models.Transaction(
@@ -751,8 +1103,9 @@ def mark_reminder_as_paid(
     )
     
     db.add(transaction)
-    db.commit()
-    db.refresh(reminder)
+    _commit_returning(db, reminder)
+    db.info.pop("reminder_cache", None)
+    invalidate_aggregates(user_id, [payment_date])
     db.refresh(transaction)
     
     return reminder, transaction
@@ -762,6 +1115,13 @@ def mark_reminder_as_paid(
 def get_spending_trends(db: Session, user_id: int, months: int = 6) -> dict:
     """Obtener tendencias de gastos e ingresos de los últimos N meses"""
     today = date.today()
+    
+    # La fecha va en la clave: al cambiar de mes cambia la ventana de meses
+    cache_key = ("trends", user_id, months, today)
+    cached = _aggregate_cache_get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    
     trends_data = {
         "months": [],
         "income": [],
@@ -784,55 +1144,70 @@ def get_spending_trends(db: Session, user_id: int, months: int = 6) -> dict:
         }
     }
     
-    # Calcular datos para cada mes
-    for i in range(months - 1, -1, -1):
-        # Calcular mes y año
-        target_month = today.month - i
-        target_year = today.year
-        
-        while target_month <= 0:
-            target_month += 12
-            target_year -= 1
-        
-        # Obtener transacciones del mes
-        total_income = db.query(func.sum(models.Transaction.amount)).filter(
-            models.Transaction.user_id == user_id,
-            models.Transaction.type == 1,  # ingreso
-            extract('month', models.Transaction.date) == target_month,
-            extract('year', models.Transaction.date) == target_year
-        ).scalar() or 0
-        
-        total_expenses = db.query(func.sum(models.Transaction.amount)).filter(
-            models.Transaction.user_id == user_id,
-            models.Transaction.type == 2,  # gasto
-            extract('month', models.Transaction.date) == target_month,
-            extract('year', models.Transaction.date) == target_year
-        ).scalar() or 0
-        
+    # Lista de meses a reportar, del más antiguo al actual
+    # Índice absoluto de meses (año * 12 + mes - 1) para retroceder sin bucles de ajuste
+    current_index = today.year * 12 + today.month - 1
+    month_list = [
+        (index // 12, index % 12 + 1)
+        for index in range(current_index - months + 1, current_index + 1)
+    ]
+    
+    if not month_list:
+        return trends_data
+    
+    # Una sola consulta agrupada por mes, tipo y categoría para todo el rango
+    range_start = _month_bounds(*month_list[0])[0]
+    range_end = _month_bounds(*month_list[-1])[1]
+    year_col = extract('year', models.Transaction.date).label('year')
+    month_col = extract('month', models.Transaction.date).label('month')
+    rows = db.query(
+        year_col,
+        month_col,
+        models.Transaction.type,
+        models.Category.name,
+        func.sum(models.Transaction.amount).label('total')
+    ).outerjoin(
+        models.Category,
+        models.Transaction.category_id == models.Category.id
+    ).filter(
+        models.Transaction.user_id == user_id,
+        models.Transaction.date >= range_start,
+        models.Transaction.date < range_end
+    ).group_by(
+        year_col,
+        month_col,
+        models.Transaction.type,
+        models.Category.name
+    ).all()
+    
+    # Repartir los resultados por mes
+    income_by_month = {}
+    expenses_by_month = {}
+    categories_by_month = {}
+    for row_year, row_month, row_type, cat_name, total in rows:
+        key = (int(row_year), int(row_month))
+        if row_type == 1:  # ingreso
+            income_by_month[key] = income_by_month.get(key, 0) + total
+        elif row_type == 2:  # gasto
+            expenses_by_month[key] = expenses_by_month.get(key, 0) + total
+            if cat_name is not None:
+                categories_by_month.setdefault(key, []).append((cat_name, total))
+    
+    for target_year, target_month in month_list:
+        key = (target_year, target_month)
+        total_income = income_by_month.get(key, 0)
+        total_expenses = expenses_by_month.get(key, 0)
         balance = total_income - total_expenses
         
         # Agregar a listas
-        month_name = calendar.month_name[target_month][:3]  # Ene, Feb, Mar...
+        month_name = _month_abbr(target_month)  # Ene, Feb, Mar...
         trends_data["months"].append(f"{month_name} {target_year}")
         trends_data["income"].append(float(total_income))
         trends_data["expenses"].append(float(total_expenses))
         trends_data["balance"].append(float(balance))
         
         # Gastos por categoría del mes
-        categories = db.query(
-            models.Category.name,
-            func.sum(models.Transaction.amount).label('total')
-        ).join(
-            models.Transaction,
-            models.Transaction.category_id == models.Category.id
-        ).filter(
-            models.Transaction.user_id == user_id,
-            models.Transaction.type == 2,  # gastos
-            extract('month', models.Transaction.date) == target_month,
-            extract('year', models.Transaction.date) == target_year
-        ).group_by(models.Category.name).all()
-        
-        for cat_name, cat_total in categories:
+        for cat_name, cat_total in sorted(categories_by_month.get(key, [])):
             if cat_name not in trends_data["categories_trend"]:
                 trends_data["categories_trend"][cat_name] = []
             trends_data["categories_trend"][cat_name].append(float(cat_total))
@@ -865,7 +1240,8 @@ def get_spending_trends(db: Session, user_id: int, months: int = 6) -> dict:
             trends_data["prediction"]["next_month_expenses"]
         )
     
-    return trends_data
+    _aggregate_cache_put(cache_key, trends_data)
+    return copy.deepcopy(trends_data)
 
 
 # ========== IMPORT RULES CRUD ==========
@@ -877,58 +1253,100 @@ def get_import_rules(db: Session, user_id: int) -> List[models.ImportRule]:
     ).order_by(models.ImportRule.priority.desc()).all()
 
 
-def create_import_rule(db: Session, rule: schemas.ImportRuleCreate, user_id: int) -> models.ImportRule:
-    """Crear nueva regla de importación"""
+def create_import_rule(
+    db: Session,
+    rule: schemas.ImportRuleCreate,
+    user_id: int,
+    *,
+    commit: bool = True
+) -> models.ImportRule:
+    """
+    Crear nueva regla de importación
+    
+    Con commit=False solo se hace flush y el llamador confirma una vez al final
+    (útil al crear/modificar varias en un mismo request).
+    """
     db_rule = models.ImportRule(
         **rule.model_dump(),
         user_id=user_id
     )
     db.add(db_rule)
-    db.commit()
-    db.refresh(db_rule)
+    db.flush()
+    if commit:
+        db.commit()
+        db.refresh(db_rule)
     return db_rule
 
 
-def update_import_rule(db: Session, rule_id: int, rule: schemas.ImportRuleUpdate, user_id: int) -> Optional[models.ImportRule]:
-    """Actualizar regla de importación"""
-    db_rule = db.query(models.ImportRule).filter(
-        models.ImportRule.id == rule_id,
-        models.ImportRule.user_id == user_id
-    ).first()
+def update_import_rule(
+    db: Session,
+    rule_id: int,
+    rule: schemas.ImportRuleUpdate,
+    user_id: int,
+    *,
+    commit: bool = True
+) -> Optional[models.ImportRule]:
+    """
+    Actualizar regla de importación
+    
+    Con commit=False solo se hace flush y el llamador confirma una vez al final
+    (útil al crear/modificar varias en un mismo request).
+    """
+    update_data = rule.model_dump(exclude_unset=True)
+    if not update_data:
+        return db.execute(
+            select(models.ImportRule).where(
+                models.ImportRule.id == rule_id,
+                models.ImportRule.user_id == user_id
+            )
+        ).scalar_one_or_none()
+    
+    db_rule = db.execute(
+        update(models.ImportRule)
+        .where(models.ImportRule.id == rule_id, models.ImportRule.user_id == user_id)
+        .values(**update_data)
+        .returning(models.ImportRule)
+    ).scalar_one_or_none()
     
     if not db_rule:
+        if commit:
+            db.rollback()
         return None
     
-    for key, value in rule.model_dump(exclude_unset=True).items():
-        setattr(db_rule, key, value)
-    
-    db.commit()
-    db.refresh(db_rule)
-    return db_rule
+    return _commit_returning(db, db_rule) if commit else db_rule
 
 
-def delete_import_rule(db: Session, rule_id: int, user_id: int) -> bool:
-    """Eliminar regla de importación"""
-    db_rule = db.query(models.ImportRule).filter(
-        models.ImportRule.id == rule_id,
-        models.ImportRule.user_id == user_id
-    ).first()
-    
-    if not db_rule:
-        return False
+def delete_import_rule(db: Session, rule_id: int, user_id: int, *, commit: bool = True) -> bool:
+    """
+    Eliminar regla de importación
     
-    db.delete(db_rule)
-    db.commit()
-    return True
+    Con commit=False el DELETE no se confirma y el llamador confirma una vez al
+    final (útil al crear/modificar varias en un mismo request).
+    """
+    return _delete_owned(db, models.ImportRule, rule_id, user_id, commit=commit)
 
 
-def apply_import_rules(db: Session, user_id: int, description: str) -> Optional[int]:
-    """Aplicar reglas de importación para auto-categorizar basado en descripción"""
+def apply_import_rules(
+    db: Session,
+    user_id: int,
+    description: str,
+    rules: Optional[List[models.ImportRule]] = None,
+    description_lower: Optional[str] = None
+) -> Optional[int]:
+    """
+    Aplicar reglas de importación para auto-categorizar basado en descripción
+    
+    Para categorizar varias descripciones, pasar `rules` (ya leídas con
+    get_import_rules) evita repetir la consulta en cada llamada; si el llamador
+    ya tiene la descripción en minúsculas puede pasarla en `description_lower`.
+    """
     # Obtener reglas ordenadas por prioridad
-    rules = get_import_rules(db, user_id)
+    if rules is None:
+        rules = get_import_rules(db, user_id)
     
     # Buscar coincidencia
-    description_lower = description.lower()
+    if description_lower is None:
+        description_lower = description.lower()
     for rule in rules:
         if rule.keyword.lower() in description_lower:
             return rule.category_id
@@ -936,6 +1354,33 @@ def apply_import_rules(db: Session, user_id: int, description: str) -> Optional[
     return None
 
 
+def build_import_rules_matcher(rules: List[models.ImportRule]) -> ahocorasick.Automaton:
+    """
+    Compilar las reglas en un autómata Aho-Corasick para buscar todas las palabras
+    clave en una sola pasada por la descripción
+    
+    Cada palabra clave guarda (posición, category_id), con la posición en el orden
+    de prioridad de `rules`; ante una palabra repetida gana la regla más prioritaria.
+    """
+    automaton = ahocorasick.Automaton()
+    for rank, rule in enumerate(rules):
+        keyword = rule.keyword.lower()
+        if keyword not in automaton:
+            automaton.add_word(keyword, (rank, rule.category_id))
+    automaton.make_automaton()
+    return automaton
+
+
+def match_import_rules(automaton: ahocorasick.Automaton, description_lower: str) -> Optional[int]:
+    """Categoría de la regla más prioritaria cuya palabra clave aparece en la descripción (ya en minúsculas)"""
+    # Un autómata sin palabras no admite búsquedas
+    if automaton.kind == ahocorasick.EMPTY:
+        return None
+    
+    best = min((match for _, match in automaton.iter(description_lower)), default=None)
+    return best[1] if best is not None else None
+
+
 # ========== PENDING TRANSACTIONS CRUD ==========
 def get_pending_transactions(db: Session, user_id: int, batch_id: Optional[str] = None) -> List[models.PendingTransaction]:
     """Obtener transacciones pendientes de confirmación"""
@@ -950,19 +1395,53 @@ def get_pending_transactions(db: Session, user_id: int, batch_id: Optional[str]
     return query.order_by(models.PendingTransaction.date.desc()).all()
 
 
+def iter_pending_transactions(
+    db: Session,
+    user_id: int,
+    batch_id: Optional[str] = None,
+    batch_size: int = 1000
+) -> Iterator[models.PendingTransaction]:
+    """
+    Recorrer transacciones pendientes sin materializarlas todas
+    
+    Alternativa a get_pending_transactions para lotes de importación grandes
+    (respuestas en streaming, exportaciones): las filas se leen en lotes de
+    batch_size. El iterador debe consumirse mientras la sesión siga abierta.
+    """
+    stmt = select(models.PendingTransaction).where(
+        models.PendingTransaction.user_id == user_id,
+        models.PendingTransaction.is_confirmed == False
+    )
+    
+    if batch_id:
+        stmt = stmt.where(models.PendingTransaction.import_batch_id == batch_id)
+    
+    stmt = stmt.order_by(models.PendingTransaction.date.desc()).execution_options(yield_per=batch_size)
+    yield from db.scalars(stmt)
+
+
 def create_pending_transaction(
     db: Session, 
     transaction: schemas.PendingTransactionCreate, 
-    user_id: int
+    user_id: int,
+    *,
+    commit: bool = True
 ) -> models.PendingTransaction:
-    """Crear transacción pendiente"""
+    """
+    Crear transacción pendiente
+    
+    Con commit=False solo se hace flush y el llamador confirma una vez al final
+    (útil al crear/modificar varias en un mismo request).
+    """
     db_transaction = models.PendingTransaction(
         **transaction.model_dump(),
         user_id=user_id
     )
     db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    db.flush()
+    if commit:
+        db.commit()
+        db.refresh(db_transaction)
     return db_transaction
 
 
@@ -970,22 +1449,33 @@ def update_pending_transaction_category(
     db: Session, 
     transaction_id: int, 
     category_id: int, 
-    user_id: int
+    user_id: int,
+    *,
+    commit: bool = True
 ) -> Optional[models.PendingTransaction]:
-    """Actualizar categoría de transacción pendiente"""
-    db_transaction = db.query(models.PendingTransaction).filter(
-        models.PendingTransaction.id == transaction_id,
-        models.PendingTransaction.user_id == user_id,
-        models.PendingTransaction.is_confirmed == False
-    ).first()
+    """
+    Actualizar categoría de transacción pendiente
+    
+    Con commit=False solo se hace flush y el llamador confirma una vez al final
+    (útil al crear/modificar varias en un mismo request).
+    """
+    db_transaction = db.execute(
+        update(models.PendingTransaction)
+        .where(
+            models.PendingTransaction.id == transaction_id,
+            models.PendingTransaction.user_id == user_id,
+            models.PendingTransaction.is_confirmed == False
+        )
+        .values(category_id=category_id)
+        .returning(models.PendingTransaction)
+    ).scalar_one_or_none()
     
     if not db_transaction:
+        if commit:
+            db.rollback()
         return None
     
-    db_transaction.category_id = category_id
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    return _commit_returning(db, db_transaction) if commit else db_transaction
 
 
 def confirm_pending_transactions(
@@ -994,62 +1484,255 @@ def confirm_pending_transactions(
     user_id: int,
     category_assignments: Optional[dict] = None
 ) -> int:
-    """Confirmar transacciones pendientes y convertirlas en transacciones reales"""
-    confirmed_count = 0
+    """
+    Confirmar transacciones pendientes y convertirlas en transacciones reales
     
-    for trans_id in transaction_ids:
-        # Obtener transacción pendiente
-        pending = db.query(models.PendingTransaction).filter(
-            models.PendingTransaction.id == trans_id,
+    Trabaja por lotes: una consulta para leer las pendientes, un INSERT con todas
+    las transacciones nuevas y un UPDATE por clave primaria que las marca como
+    confirmadas (guardando la categoría asignada).
+    """
+    pendings = db.execute(
+        select(
+            models.PendingTransaction.id,
+            models.PendingTransaction.category_id,
+            models.PendingTransaction.amount,
+            models.PendingTransaction.type,
+            models.PendingTransaction.description,
+            models.PendingTransaction.date
+        ).where(
+            models.PendingTransaction.id.in_(transaction_ids),
             models.PendingTransaction.user_id == user_id,
             models.PendingTransaction.is_confirmed == False
-        ).first()
-        
-        if not pending:
-            continue
-        
+        )
+    ).all()
+    
+    assignments = category_assignments or {}
+    new_transactions = []
+    confirmed = []
+    
+    for pending in pendings:
         # Aplicar asignación de categoría si se proporcionó
-        if category_assignments and str(trans_id) in category_assignments:
-            pending.category_id = category_assignments[str(trans_id)]
+        category_id = assignments.get(str(pending.id), pending.category_id)
         
         # Verificar que tenga categoría
-        if not pending.category_id:
+        if not category_id:
             continue
         
-        # Crear transacción real
-        transaction = models.Transaction(
-            user_id=user_id,
-            category_id=pending.category_id,
-            amount=pending.amount,
-            type=pending.type,
-            description=pending.description,
-            date=pending.date
-        )
-        
-        db.add(transaction)
-        
-        # Marcar como confirmada
-        pending.is_confirmed = True
-        
-        confirmed_count += 1
+        new_transactions.append({
+            "user_id": user_id,
+            "category_id": category_id,
+            "amount": pending.amount,
+            "type": pending.type,
+            "description": pending.description,
+            "date": pending.date
+        })
+        confirmed.append({"id": pending.id, "category_id": category_id, "is_confirmed": True})
+    
+    if not confirmed:
+        return 0
     
+    db.execute(insert(models.Transaction), new_transactions)
+    db.execute(update(models.PendingTransaction), confirmed)
     db.commit()
-    return confirmed_count
+    invalidate_aggregates(user_id, [row["date"] for row in new_transactions])
+    return len(confirmed)
 
 
-def delete_pending_transaction(db: Session, transaction_id: int, user_id: int) -> bool:
-    """Eliminar transacción pendiente"""
-    db_transaction = db.query(models.PendingTransaction).filter(
-        models.PendingTransaction.id == transaction_id,
-        models.PendingTransaction.user_id == user_id
-    ).first()
+def delete_pending_transaction(db: Session, transaction_id: int, user_id: int, *, commit: bool = True) -> bool:
+    """
+    Eliminar transacción pendiente
     
-    if not db_transaction:
-        return False
+    Con commit=False el DELETE no se confirma y el llamador confirma una vez al
+    final (útil al crear/modificar varias en un mismo request).
+    """
+    return _delete_owned(db, models.PendingTransaction, transaction_id, user_id, commit=commit)
+
+
+# Firmas de archivo: .xlsx es un zip, .xls un documento OLE
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+# Bytes del comienzo del archivo usados para detectar el separador y la codificación
+CSV_SNIFF_BYTES = 8192
+CSV_ENCODING_SAMPLE_BYTES = 65536
+
+# Codificaciones en que exportan los bancos; acotar la detección evita
+# confundir cp1252 con otras páginas de códigos (p. ej. la Ñ en cp1250)
+CSV_CANDIDATE_ENCODINGS = ['utf_8', 'cp1252', 'latin_1']
+
+
+def _detect_csv_encoding(file_content: bytes) -> str:
+    """Detectar la codificación de la cartola con una sola pasada sobre su comienzo"""
+    if file_content.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
     
-    db.delete(db_transaction)
-    db.commit()
-    return True
+    best = from_bytes(
+        file_content[:CSV_ENCODING_SAMPLE_BYTES],
+        cp_isolation=CSV_CANDIDATE_ENCODINGS
+    ).best()
+    return best.encoding if best is not None else 'latin1'
+
+
+def _read_bank_csv(file_content: bytes) -> tuple[List[str], Iterator[dict]]:
+    """
+    Leer una cartola CSV con el módulo csv, fila a fila
+    
+    Salta las líneas previas al encabezado (la primera que menciona la fecha y la
+    descripción/detalle) y devuelve sus columnas junto a un iterador de filas
+    como diccionarios; las celdas que faltan quedan en None.
+    """
+    encoding = _detect_csv_encoding(file_content)
+    sample = file_content[:CSV_SNIFF_BYTES].decode(encoding, errors='replace')
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=';,\t').delimiter
+    except csv.Error:
+        delimiter = None
+    
+    text = TextIOWrapper(BytesIO(file_content), encoding=encoding, errors='replace', newline='')
+    
+    # Buscar la fila de encabezado (las cartolas traen datos del cliente antes)
+    for line in text:
+        line_lower = line.lower()
+        if 'fecha' in line_lower and ('descripción' in line_lower or 'descripcion' in line_lower or 'detalle' in line_lower):
+            break
+    else:
+        raise ValueError("No se pudo leer el archivo. Verifica el formato.")
+    
+    # El encabezado manda si la muestra no permitió detectar el separador
+    if delimiter is None or delimiter not in line:
+        delimiter = max(';,\t', key=line.count)
+    
+    columns = [col.strip() for col in next(csv.reader([line], delimiter=delimiter))]
+    return columns, csv.DictReader(text, fieldnames=columns, delimiter=delimiter)
+
+
+# Filas de la cartola que no son movimientos (totales y notas al pie)
+_NOISE_RE = re.compile(r'subtotal|notas:|informaci[oó]n referencial', re.IGNORECASE)
+
+# Máximo de montos distintos para filtrar también por monto al buscar duplicados
+IMPORT_DEDUPE_MAX_AMOUNTS = 500
+
+# Montos en formato chileno: elimina separadores de miles (punto) y usa punto decimal
+_AMOUNT_TRANS = str.maketrans({'.': None, ',': '.'})
+
+# Fechas que empiezan con el año (2026-01-04): se leen año-mes-día; el resto de
+# las numéricas (05/01/2026, 05-01-2026) con el día primero, como en Chile
+_ISO_DATE_RE = re.compile(r'\s*\d{4}-\d{1,2}-\d{1,2}')
+
+# Meses en español por sus tres primeras letras ("ene", "enero" -> 1)
+_MESES_ES = {
+    'ene': 1, 'feb': 2, 'mar': 3, 'abr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'ago': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dic': 12
+}
+
+@lru_cache(maxsize=2048)
+def _parse_es_date(fecha_str: str, now_month: int, now_year: int) -> Optional[date]:
+    """
+    Parsear una fecha "día/mes" con el mes en español, o None si no tiene ese formato
+    
+    El año se deduce del mes y año actuales: diciembre leído en enero es del año
+    anterior y enero leído en diciembre, del siguiente. Una cartola repite pocas
+    fechas distintas, por eso el resultado se memoiza.
+    """
+    # "02/Ene", "2 / enero": un partition y una búsqueda por las tres primeras letras
+    dia, sep, mes_str = fecha_str.partition('/')
+    if not sep:
+        return None
+    
+    dia = dia.strip()
+    mes_str = mes_str.strip().rstrip('.')
+    mes = _MESES_ES.get(mes_str[:3].lower()) if mes_str.isalpha() else None
+    if mes is None or not dia.isdigit():
+        return None
+    
+    anio = now_year
+    if mes == 12 and now_month == 1:
+        anio -= 1
+    elif mes == 1 and now_month == 12:
+        anio += 1
+    
+    try:
+        return date(anio, mes, int(dia))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=2048)
+def _parse_date(fecha_str: str) -> Optional[date]:
+    """Fecha de una celda de texto según _ISO_DATE_RE, o None si no se reconoce"""
+    import pandas as pd
+    
+    parsed = pd.to_datetime(fecha_str, errors='coerce', dayfirst=not _ISO_DATE_RE.match(fecha_str))
+    return None if pd.isna(parsed) else parsed.date()
+
+
+def _date_column(series):
+    """Versión vectorizada de _parse_date para una columna de Excel (NaT si no se reconoce)"""
+    import pandas as pd
+    
+    # Las celdas que ya son fechas no dependen de dayfirst
+    is_iso = series.map(lambda value: isinstance(value, str) and _ISO_DATE_RE.match(value) is not None)
+    iso = pd.to_datetime(series.where(is_iso), errors='coerce', format='mixed')
+    day_first = pd.to_datetime(series.where(~is_iso), errors='coerce', format='mixed', dayfirst=True)
+    return iso.fillna(day_first)
+
+
+def _parse_amount(value) -> float:
+    """Monto de una celda: los números se usan tal cual; el texto viene en formato chileno (1.250.000,50)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    amount_str = str(value).strip().translate(_AMOUNT_TRANS)
+    return float(amount_str) if amount_str else 0.0
+
+
+def _amount_column(series):
+    """Versión vectorizada de _parse_amount para una columna de Excel (vacíos -> 0)"""
+    import numpy as np
+    import pandas as pd
+    
+    # Columna sin textos (números y vacíos): conversión directa
+    if pd.api.types.infer_dtype(series, skipna=True) in ('integer', 'floating', 'mixed-integer-float', 'empty'):
+        return pd.to_numeric(series, errors='coerce').fillna(0).astype(float)
+    
+    # Resto (texto, mixta, o una columna mal detectada con fechas o booleanos): las
+    # celdas de texto se limpian con .str y las numéricas se toman directamente;
+    # cualquier otro valor queda en 0 y la fila se omite, como antes
+    series = series.astype(object)
+    is_text = series.map(lambda value: isinstance(value, str))
+    is_number = series.map(
+        lambda value: isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_))
+    )
+    text = series.where(is_text).astype('string')
+    cleaned = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.strip()
+    from_text = pd.to_numeric(cleaned, errors='coerce')
+    from_numbers = pd.to_numeric(series.where(is_number), errors='coerce')
+    return from_text.fillna(from_numbers).fillna(0).astype(float)
+
+
+def _existing_import_keys(
+    db: Session,
+    user_id: int,
+    first_date: date,
+    last_date: date,
+    amounts: set
+) -> set:
+    """
+    Claves (fecha, monto, descripción) ya registradas, confirmadas o pendientes,
+    que podrían repetirse en el archivo importado
+    
+    Solo se leen las del rango de fechas del archivo y, si no son demasiados
+    montos distintos, solo las de esos montos.
+    """
+    existing_keys = set()
+    for model in (models.Transaction, models.PendingTransaction):
+        query = select(model.date, model.amount, model.description).where(
+            model.user_id == user_id,
+            model.date.between(first_date, last_date)
+        )
+        if len(amounts) <= IMPORT_DEDUPE_MAX_AMOUNTS:
+            query = query.where(model.amount.in_(amounts))
+        existing_keys.update(db.execute(query).all())
+    return existing_keys
 
 
 def parse_bank_excel(file_content: bytes, user_id: int, db: Session) -> dict:
@@ -1058,54 +1741,30 @@ def parse_bank_excel(file_content: bytes, user_id: int, db: Session) -> dict:
     Formato esperado: Fecha | Descripción | Cargo/Abono
     """
     import pandas as pd
-    from io import BytesIO
     import uuid
     
     # Generar ID de lote
     batch_id = str(uuid.uuid4())[:8]
     
-    # Intentar leer como Excel primero, luego como CSV
-    df = None
-    try:
-        df = pd.read_excel(BytesIO(file_content))
-    except:
-        # Intentar leer como CSV con diferentes configuraciones
-        for sep in [';', ',', '\t']:  # Probar diferentes separadores
-            for encoding in ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']:
-                try:
-                    # Reiniciar BytesIO para cada intento
-                    content_io = BytesIO(file_content)
-                    
-                    # Leer todo el archivo para buscar la fila de encabezado
-                    df_test = pd.read_csv(content_io, sep=sep, encoding=encoding, header=None)
-                    
-                    # Buscar fila que contenga "Fecha" (columna de encabezado típica)
-                    header_row = None
-                    for idx, row in df_test.iterrows():
-                        row_str = ' '.join(str(cell).lower() for cell in row if pd.notna(cell))
-                        if 'fecha' in row_str and ('descripción' in row_str or 'descripcion' in row_str or 'detalle' in row_str):
-                            header_row = idx
-                            break
-                    
-                    if header_row is not None:
-                        # Leer nuevamente usando la fila correcta como encabezado
-                        content_io = BytesIO(file_content)  # Reiniciar nuevamente
-                        df = pd.read_csv(content_io, sep=sep, encoding=encoding, header=header_row)
-                        break
-                except:
-                    continue
-            
-            if df is not None:
-                break
-    
-    if df is None or df.empty:
-        raise ValueError("No se pudo leer el archivo. Verifica el formato.")
-    
-    # Normalizar nombres de columnas
-    df.columns = df.columns.str.strip()
+    # Los .xlsx (zip) y .xls (OLE) se reconocen por su firma; el resto se trata como CSV
+    if file_content.startswith((XLSX_MAGIC, XLS_MAGIC)):
+        try:
+            df = pd.read_excel(BytesIO(file_content))
+        except Exception:
+            raise ValueError("No se pudo leer el archivo. Verifica el formato.")
+        
+        if df.empty:
+            raise ValueError("No se pudo leer el archivo. Verifica el formato.")
+        
+        # Normalizar nombres de columnas
+        df.columns = [str(col).strip() for col in df.columns]
+        columns = list(df.columns)
+    else:
+        df = None
+        columns, records = _read_bank_csv(file_content)
     
     # Crear versión lowercase para comparación
-    cols_lower = {col: col.lower() for col in df.columns}
+    cols_lower = {col: col.lower() for col in columns}
     
     # Intentar identificar columnas (flexible para diferentes formatos)
     date_col = None
@@ -1124,13 +1783,39 @@ def parse_bank_excel(file_content: bytes, user_id: int, db: Session) -> dict:
             abono_col = col
     
     if not date_col:
-        raise ValueError(f"No se encontró columna de fecha. Columnas disponibles: {', '.join(df.columns)}")
+        raise ValueError(f"No se encontró columna de fecha. Columnas disponibles: {', '.join(columns)}")
     
     if not desc_col:
-        raise ValueError(f"No se encontró columna de descripción. Columnas disponibles: {', '.join(df.columns)}")
+        raise ValueError(f"No se encontró columna de descripción. Columnas disponibles: {', '.join(columns)}")
     
     if not cargo_col and not abono_col:
-        raise ValueError(f"No se encontraron columnas de Cargo/Abono. Columnas disponibles: {', '.join(df.columns)}")
+        raise ValueError(f"No se encontraron columnas de Cargo/Abono. Columnas disponibles: {', '.join(columns)}")
+    
+    # Ambas ramas entregan tuplas (fecha, descripción, cargo, abono) por fila
+    if df is not None:
+        # Excel: fechas y montos se convierten por columna en una sola pasada.
+        # Las fechas que pandas no reconoce (p. ej. "02/Ene") conservan el valor
+        # original para el formato en español de más abajo.
+        fechas = _date_column(df[date_col])
+        selected = pd.DataFrame({
+            'fecha': fechas.dt.date.astype(object).where(fechas.notna(), df[date_col]),
+            'descripcion': df[desc_col],
+            'cargo': _amount_column(df[cargo_col]) if cargo_col else 0.0,
+            'abono': _amount_column(df[abono_col]) if abono_col else 0.0,
+        })
+        
+        # Celdas vacías (NaN) -> None, igual que en el CSV
+        rows = selected.astype(object).where(selected.notna(), None).itertuples(index=False, name=None)
+    else:
+        rows = (
+            (
+                record.get(date_col),
+                record.get(desc_col),
+                record.get(cargo_col) if cargo_col else None,
+                record.get(abono_col) if abono_col else None
+            )
+            for record in records
+        )
     
     total_imported = 0
     duplicates_skipped = 0
@@ -1138,104 +1823,62 @@ def parse_bank_excel(file_content: bytes, user_id: int, db: Session) -> dict:
     pending_transactions = []
     errors = []
     
-    for idx, row in df.iterrows():
+    # Referencia para deducir el año de las fechas sin año ("02/Ene")
+    now = datetime.now()
+    
+    # Reglas de categorización: una consulta y un autómata para todo el archivo
+    rules_matcher = build_import_rules_matcher(get_import_rules(db, user_id))
+    category_cache: dict[str, Optional[int]] = {}  # Los comercios se repiten en la cartola
+    
+    # Primera pasada: filas válidas como (fecha, monto, tipo, descripción)
+    parsed_rows = []
+    
+    for idx, (fecha_raw, descripcion_raw, cargo_val, abono_val) in enumerate(rows):
         try:
             # Extraer fecha
-            fecha_raw = row[date_col]
-            if pd.isna(fecha_raw):
+            if not fecha_raw or not str(fecha_raw).strip():
                 continue
             
             # Intentar parsear fecha con diferentes formatos
-            fecha = None
+            fecha = fecha_raw if isinstance(fecha_raw, date) else None
             fecha_str = str(fecha_raw).strip()
             
-            # Mapeo de meses en español
-            meses_es = {
-                'ene': '01', 'enero': '01',
-                'feb': '02', 'febrero': '02',
-                'mar': '03', 'marzo': '03',
-                'abr': '04', 'abril': '04',
-                'may': '05', 'mayo': '05',
-                'jun': '06', 'junio': '06',
-                'jul': '07', 'julio': '07',
-                'ago': '08', 'agosto': '08',
-                'sep': '09', 'septiembre': '09',
-                'oct': '10', 'octubre': '10',
-                'nov': '11', 'noviembre': '11',
-                'dic': '12', 'diciembre': '12'
-            }
-            
-            # Si tiene formato "02/Ene" o similar
-            if '/' in fecha_str and any(mes in fecha_str.lower() for mes in meses_es.keys()):
-                from datetime import datetime
-                parts = fecha_str.split('/')
-                if len(parts) == 2:
-                    dia = parts[0].zfill(2)
-                    mes_str = parts[1].lower()
-                    mes = meses_es.get(mes_str, '01')
-                    
-                    # Determinar año basado en el mes
-                    # Si es diciembre y estamos en enero, es año anterior
-                    # Si es enero y estamos en diciembre, es año siguiente
-                    now = datetime.now()
-                    anio = now.year
-                    
-                    if mes == '12' and now.month == 1:
-                        anio = now.year - 1
-                    elif mes == '01' and now.month == 12:
-                        anio = now.year + 1
-                    
-                    fecha_str_formatted = f"{anio}-{mes}-{dia}"
-                    try:
-                        fecha = datetime.strptime(fecha_str_formatted, "%Y-%m-%d").date()
-                    except:
-                        pass
+            # Formato "02/Ene" (día y mes abreviado en español, sin año)
+            if not fecha:
+                fecha = _parse_es_date(fecha_str, now.month, now.year)
             
-            # Si no se pudo parsear con el formato especial, intentar pandas
+            # Si no se pudo parsear con el formato especial, la misma regla que en Excel
             if not fecha:
-                try:
-                    fecha = pd.to_datetime(fecha_raw, errors='coerce').date()
-                except:
-                    pass
+                fecha = _parse_date(fecha_str)
             
-            if not fecha or pd.isna(fecha):
+            if not fecha:
                 errors.append(f"Fila {idx+2}: Fecha inválida '{fecha_raw}'")
                 continue
             
             # Extraer descripción
-            descripcion = str(row[desc_col]).strip()
-            if descripcion == 'nan' or not descripcion or descripcion == '':
+            descripcion = str(descripcion_raw or '').strip()
+            if not descripcion:
                 continue
             
             # Ignorar filas que contienen totales o notas
-            if any(word in descripcion.lower() for word in ['subtotal', 'notas:', 'información referencial']):
+            if _NOISE_RE.search(descripcion):
                 continue
             
             # Determinar monto y tipo - manejar valores vacíos, NaN, y strings vacíos
             cargo = 0
             abono = 0
             
-            if cargo_col:
-                cargo_val = row[cargo_col]
-                if pd.notna(cargo_val) and str(cargo_val).strip() != '':
-                    try:
-                        # Eliminar separadores de miles (punto) y convertir
-                        cargo_str = str(cargo_val).replace('.', '').replace(',', '.').strip()
-                        if cargo_str:
-                            cargo = float(cargo_str)
-                    except:
-                        pass
+            if cargo_val and str(cargo_val).strip():
+                try:
+                    cargo = _parse_amount(cargo_val)
+                except ValueError:
+                    pass
             
-            if abono_col:
-                abono_val = row[abono_col]
-                if pd.notna(abono_val) and str(abono_val).strip() != '':
-                    try:
-                        # Eliminar separadores de miles (punto) y convertir
-                        abono_str = str(abono_val).replace('.', '').replace(',', '.').strip()
-                        if abono_str:
-                            abono = float(abono_str)
-                    except:
-                        pass
+            if abono_val and str(abono_val).strip():
+                try:
+                    abono = _parse_amount(abono_val)
+                except ValueError:
+                    pass
             
             # Determinar tipo de transacción
             if cargo > 0:
@@ -1248,66 +1891,77 @@ def parse_bank_excel(file_content: bytes, user_id: int, db: Session) -> dict:
                 # Ambos están vacíos o en cero, saltar
                 continue
             
-            # Verificar si ya existe una transacción con los mismos datos (evitar duplicados)
-            descripcion_corta = descripcion[:200]
-            
-            # Buscar en transacciones confirmadas
-            existe_confirmada = db.query(models.Transaction).filter(
-                models.Transaction.user_id == user_id,
-                models.Transaction.date == fecha,
-                models.Transaction.amount == amount,
-                models.Transaction.description == descripcion_corta
-            ).first()
-            
-            # Buscar en transacciones pendientes
-            existe_pendiente = db.query(models.PendingTransaction).filter(
-                models.PendingTransaction.user_id == user_id,
-                models.PendingTransaction.date == fecha,
-                models.PendingTransaction.amount == amount,
-                models.PendingTransaction.description == descripcion_corta
-            ).first()
-            
-            # Si ya existe, saltar esta transacción
-            if existe_confirmada or existe_pendiente:
-                duplicates_skipped += 1
-                continue
-            
-            # Intentar auto-categorizar
-            category_id = apply_import_rules(db, user_id, descripcion)
-            auto_cat = category_id is not None
-            
-            if auto_cat:
-                auto_categorized += 1
-            
-            # Crear transacción pendiente
-            pending = models.PendingTransaction(
-                user_id=user_id,
-                category_id=category_id,
-                amount=amount,
-                type=trans_type,
-                description=descripcion_corta,
-                raw_description=descripcion,
-                date=fecha,
-                auto_categorized=auto_cat,
-                import_batch_id=batch_id
-            )
-            
-            db.add(pending)
-            pending_transactions.append(pending)
-            total_imported += 1
+            parsed_rows.append((fecha, amount, trans_type, descripcion))
             
         except Exception as e:
             # Ignorar filas con errores
             continue
     
-    db.commit()
+    # Claves ya registradas solo dentro del rango de fechas (y montos) del archivo
+    existing_keys = set()
+    if parsed_rows:
+        existing_keys = _existing_import_keys(
+            db,
+            user_id,
+            min(parsed[0] for parsed in parsed_rows),
+            max(parsed[0] for parsed in parsed_rows),
+            {parsed[1] for parsed in parsed_rows}
+        )
+    
+    # Segunda pasada: descartar duplicados, categorizar y acumular
+    for fecha, amount, trans_type, descripcion in parsed_rows:
+        # Verificar si ya existe una transacción con los mismos datos (evitar duplicados)
+        descripcion_corta = descripcion[:200]
+        
+        # Si ya existe (confirmada o pendiente), saltar esta transacción
+        if (fecha, amount, descripcion_corta) in existing_keys:
+            duplicates_skipped += 1
+            continue
+        
+        # Intentar auto-categorizar (una vez por descripción distinta)
+        descripcion_lower = descripcion.lower()
+        if descripcion_lower in category_cache:
+            category_id = category_cache[descripcion_lower]
+        else:
+            category_id = match_import_rules(rules_matcher, descripcion_lower)
+            category_cache[descripcion_lower] = category_id
+        auto_cat = category_id is not None
+        
+        if auto_cat:
+            auto_categorized += 1
+        
+        # Acumular transacción pendiente (se insertan todas juntas al final)
+        pending_transactions.append({
+            "user_id": user_id,
+            "category_id": category_id,
+            "amount": amount,
+            "type": trans_type,
+            "description": descripcion_corta,
+            "raw_description": descripcion,
+            "date": fecha,
+            "is_confirmed": False,
+            "auto_categorized": auto_cat,
+            "import_batch_id": batch_id
+        })
+        total_imported += 1
+    
+    # Un solo INSERT por lotes; RETURNING entrega id y created_at en el orden de las filas
+    if pending_transactions:
+        result = db.execute(
+            insert(models.PendingTransaction).returning(
+                models.PendingTransaction.id,
+                models.PendingTransaction.created_at,
+                sort_by_parameter_order=True
+            ),
+            pending_transactions
+        )
+        for pending, (pending_id, created_at) in zip(pending_transactions, result):
+            pending["id"] = pending_id
+            pending["created_at"] = created_at
     
-    # Refrescar para obtener IDs
-    for p in pending_transactions:
-        db.refresh(p)
+    db.commit()
     
-    # Convertir objetos SQLAlchemy a dicts para serialización
-    from . import schemas
+    # Convertir a esquemas para serialización
     pending_dicts = [schemas.PendingTransaction.model_validate(p) for p in pending_transactions]
     
     return {
@@ -1,17 +1,51 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Cargar variables de entorno
 load_dotenv()
 
 # SQLite database
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./control_gastos.db")
 
+# Modo depuración: las cargas perezosas no previstas fallan en vez de generar N+1
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+
+# Crear las tablas que falten al arrancar la API. En producción el esquema se
+# prepara una sola vez al desplegar y cada worker se ahorra la inspección de
+# todas las tablas.
+AUTO_CREATE_SCHEMA = os.getenv(
+    "AUTO_CREATE_SCHEMA",
+    "false" if os.getenv("ENVIRONMENT") == "production" else "true"
+).lower() in ("1", "true", "yes")
+
+# Cache de SQL compilado: holgado frente a las formas de consulta de crud.py
+QUERY_CACHE_SIZE = int(os.getenv("SQLALCHEMY_QUERY_CACHE_SIZE", "1200"))
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    # SQLite: archivo local, sin conexiones de red que reciclar
+    engine_options = {"connect_args": {"check_same_thread": False}}
+else:
+    # Servidor (PostgreSQL, etc.): pool de conexiones persistentes. Los endpoints
+    # síncronos corren en el threadpool de FastAPI (40 hilos por defecto):
+    # pool_size + max_overflow lo cubre para que ningún hilo espere conexión.
+    engine_options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "20")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_pre_ping": True,  # Descarta conexiones cortadas por el servidor
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),  # Segundos
+    }
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    query_cache_size=QUERY_CACHE_SIZE,
+    **engine_options,
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -19,6 +53,52 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def warm_up_pool() -> None:
+    """
+    Abrir de antemano las pool_size conexiones del pool (solo bases de servidor)
+    
+    Así el primer request no paga la conexión TCP/TLS y la autenticación. Las
+    conexiones se mantienen abiertas a la vez para que sean todas distintas.
+    """
+    connections = []
+    try:
+        for _ in range(engine_options.get("pool_size", 0)):
+            conn = engine.connect()
+            conn.exec_driver_sql("SELECT 1")
+            connections.append(conn)
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def create_schema():
+    """Crear las tablas e índices que falten, en una sola transacción"""
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn, checkfirst=True)
+        # Índice redundante con ix_transactions_user_date creado por versiones anteriores
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_transactions_user_date_id")
+
+
+def ensure_budget_unique_index() -> bool:
+    """
+    Crear el índice único de presupuestos en bases creadas antes de que existiera
+    
+    create_all no modifica tablas existentes, así que se ejecuta en cada arranque.
+    Si la tabla ya tiene duplicados el índice no se puede crear: devuelve False y
+    crud.create_budget sigue comprobando la existencia antes de insertar.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_budgets_user_category_month "
+                "ON budgets (user_id, category_id, month, year)"
+            )
+    except DBAPIError as exc:
+        logger.warning("No se pudo crear uq_budgets_user_category_month: %s", exc)
+        return False
+    return True
+
+
 def get_db():
     """Dependency para obtener la sesión de base de datos"""
     db = SessionLocal()
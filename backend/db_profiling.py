@@ -0,0 +1,45 @@
+"""
+Conteo de consultas SQL para depuración
+Registra las sentencias ejecutadas dentro de un bloque (p. ej. un request) para
+detectar consultas N+1 y regresiones en el número de consultas
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Sentencias del bloque en curso; None fuera de count_queries(). La lista se
+# comparte con los hilos del threadpool porque FastAPI copia el contexto.
+_current_queries: ContextVar[Optional[List[str]]] = ContextVar("current_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Anotar la sentencia si hay un conteo activo"""
+    queries = _current_queries.get()
+    if queries is not None:
+        queries.append(statement)
+
+
+def install_query_counter(engine: Engine) -> None:
+    """Registrar el listener en el engine (idempotente)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def count_queries() -> Iterator[List[str]]:
+    """
+    Registrar las sentencias SQL ejecutadas dentro del bloque
+
+    Uso:
+        with count_queries() as queries:
+            ...
+        assert len(queries) <= 3
+    """
+    queries: List[str] = []
+    token = _current_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _current_queries.reset(token)
@@ -2,27 +2,61 @@
 API FastAPI - Control de Gastos Personales
 Sistema completo con autenticación JWT, gestión de transacciones, presupuestos y recordatorios
 """
-from fastapi import FastAPI, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.datastructures import MutableHeaders
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 from typing import List, Optional
 from datetime import date, datetime, timedelta
+import anyio
+import csv
+import hashlib
 import io
 import pandas as pd
 
 from . import models, schemas, crud
-from .database import engine, get_db
-from .auth import authenticate_user, create_access_token, get_current_user
+from .database import (
+    AUTO_CREATE_SCHEMA, DEBUG, SessionLocal, create_schema, engine, ensure_budget_unique_index, get_db, warm_up_pool
+)
+from .db_profiling import count_queries, install_query_counter
+from .auth import AuthUser, authenticate_user, create_access_token_for, get_current_user, invalidate_user
+
+# Crear tablas (desactivable con AUTO_CREATE_SCHEMA=false)
+if AUTO_CREATE_SCHEMA:
+    create_schema()
+
+# Las BD existentes no reciben restricciones nuevas con create_all: el índice
+# único de presupuestos se asegura en cada arranque
+crud.BUDGET_UNIQUE_INDEX = ensure_budget_unique_index()
+
+
+def _warm_up() -> None:
+    """Abrir el pool y compilar las consultas más frecuentes antes del primer request"""
+    warm_up_pool()
+    
+    # Un usuario inexistente: no devuelve filas, pero deja el SQL en el cache de compilación
+    with SessionLocal() as db:
+        crud.get_categories(db, 0)
+        crud.get_transactions(db, 0, limit=1)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Calentamiento al iniciar cada worker"""
+    await anyio.to_thread.run_sync(_warm_up)
+    yield
 
-# Crear tablas
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Control de Gastos API",
     description="API completa para gestión de gastos personales con autenticación JWT",
-    version="2.0.0"
+    version="2.0.0",
+    # orjson serializa los listados (transacciones, presupuestos) bastante más rápido que json
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -35,6 +69,55 @@ app.add_middleware(
 )
 
 
+# Las respuestas cambian con cada escritura del usuario: el cliente puede
+# guardarlas, pero revalidándolas siempre (la revalidación con ETag es barata)
+JSON_CACHE_CONTROL = "private, no-cache"
+
+
+@app.middleware("http")
+async def etag_revalidation(request: Request, call_next):
+    """
+    ETag en las respuestas JSON de GET
+    
+    Si el cliente envía If-None-Match con el ETag del mismo contenido se responde
+    304 sin cuerpo. El ETag es un hash del cuerpo: no depende de estado
+    compartido entre workers.
+    """
+    response = await call_next(request)
+    if (
+        request.method != "GET"
+        or response.status_code != 200
+        or response.headers.get("content-type") != "application/json"
+    ):
+        return response
+    
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    # Copia de la lista cruda: conserva los headers repetidos (set-cookie, vary)
+    headers = MutableHeaders(raw=list(response.raw_headers))
+    headers["etag"] = etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers["cache-control"] = JSON_CACHE_CONTROL
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (candidate.strip() for candidate in if_none_match.split(",")):
+        # Mismos headers (X-Next-Cursor, etc.) salvo los que describen el cuerpo
+        del headers["content-length"], headers["content-type"]
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(content=body, status_code=response.status_code, headers=headers)
+
+
+if DEBUG:
+    install_query_counter(engine)
+    
+    @app.middleware("http")
+    async def db_query_count_header(request: Request, call_next):
+        """Informar en X-DB-Queries cuántas consultas SQL hizo el request (solo DEBUG)"""
+        with count_queries() as queries:
+            response = await call_next(request)
+        response.headers["X-DB-Queries"] = str(len(queries))
+        return response
+
+
 @app.get("/")
 def read_root():
     """Endpoint raíz con información de la API"""
@@ -85,9 +168,9 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/login", response_model=schemas.Token, tags=["Authentication"])
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login y obtener token JWT"""
-    user = authenticate_user(db, email=form_data.username, password=form_data.password)
+    user = await authenticate_user(db, email=form_data.username, password=form_data.password)
     
     if not user:
         raise HTTPException(
@@ -97,24 +180,24 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         )
     
     # Crear token
-    access_token = create_access_token(data={"sub": str(user.id)})
+    access_token = create_access_token_for(user.id)
     
     return schemas.Token(
         access_token=access_token,
         token_type="bearer",
-        user=schemas.User.from_orm(user)
+        user=schemas.User.model_validate(user)
     )
 
 
 @app.get("/auth/me", response_model=schemas.User, tags=["Authentication"])
-def get_current_user_info(current_user: models.User = Depends(get_current_user)):
+def get_current_user_info(current_user: AuthUser = Depends(get_current_user)):
     """Obtener información del usuario actual"""
     return current_user
 
 
 # ========== USERS ==========
 @app.get("/users/me", response_model=schemas.User, tags=["Users"])
-def read_user_me(current_user: models.User = Depends(get_current_user)):
+def read_user_me(current_user: AuthUser = Depends(get_current_user)):
     """Obtener perfil del usuario actual"""
     return current_user
 
@@ -122,13 +205,14 @@ def read_user_me(current_user: models.User = Depends(get_current_user)):
 @app.put("/users/me", response_model=schemas.User, tags=["Users"])
 def update_user_me(
     user: schemas.UserUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar perfil del usuario actual"""
     updated_user = crud.update_user(db, current_user.id, user)
     if not updated_user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    invalidate_user(current_user.id)
     return updated_user
 
 
@@ -136,7 +220,7 @@ def update_user_me(
 @app.get("/categories", response_model=List[schemas.Category], tags=["Categories"])
 def get_categories(
     include_inactive: bool = False,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener todas las categorías del usuario"""
@@ -146,7 +230,7 @@ def get_categories(
 @app.post("/categories", response_model=schemas.Category, status_code=status.HTTP_201_CREATED, tags=["Categories"])
 def create_category(
     category: schemas.CategoryCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Crear nueva categoría personalizada"""
@@ -156,7 +240,7 @@ def create_category(
 @app.get("/categories/{category_id}", response_model=schemas.Category, tags=["Categories"])
 def get_category(
     category_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener categoría por ID"""
@@ -170,7 +254,7 @@ def get_category(
 def update_category(
     category_id: int,
     category: schemas.CategoryUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar categoría"""
@@ -183,7 +267,7 @@ def update_category(
 @app.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Categories"])
 def delete_category(
     category_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Eliminar categoría"""
@@ -193,8 +277,18 @@ def delete_category(
 
 
 # ========== TRANSACTIONS ==========
+def _parse_transactions_cursor(cursor: str):
+    """Convertir el token 'YYYY-MM-DD_id' en la clave (date, id) del listado"""
+    try:
+        cursor_date, cursor_id = cursor.split("_", 1)
+        return date.fromisoformat(cursor_date), int(cursor_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
 @app.get("/transactions", response_model=List[schemas.Transaction], tags=["Transactions"])
 def get_transactions(
+    response: Response,
     category_id: Optional[int] = None,
     type: Optional[str] = None,
     start_date: Optional[date] = None,
@@ -202,13 +296,31 @@ def get_transactions(
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
     search_text: Optional[str] = None,
-    skip: int = 0,
+    skip: int = Query(0, deprecated=True, description="Usar cursor o after_date/after_id"),
     limit: int = 100,
-    current_user: models.User = Depends(get_current_user),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    after_date: Optional[date] = Query(None, description="Fecha de la última transacción recibida"),
+    after_id: Optional[int] = Query(None, description="ID de la última transacción recibida"),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Obtener transacciones con filtros avanzados"""
-    return crud.get_transactions(
+    """
+    Obtener transacciones con filtros avanzados
+    
+    Paginación por clave: la página siguiente empieza después de la transacción
+    (after_date, after_id), o del token cursor equivalente. Si la página viene
+    completa, el header X-Next-Cursor trae el cursor de la siguiente.
+    """
+    if cursor:
+        page_key = _parse_transactions_cursor(cursor)
+    elif after_date is not None or after_id is not None:
+        if after_date is None or after_id is None:
+            raise HTTPException(status_code=400, detail="after_date y after_id deben enviarse juntos")
+        page_key = (after_date, after_id)
+    else:
+        page_key = None
+    
+    transactions = crud.get_transactions(
         db,
         current_user.id,
         category_id=category_id,
@@ -219,14 +331,19 @@ def get_transactions(
         max_amount=max_amount,
         search_text=search_text,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=page_key
     )
+    if limit and len(transactions) == limit:
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = f"{last.date.isoformat()}_{last.id}"
+    return transactions
 
 
 @app.post("/transactions", response_model=schemas.Transaction, status_code=status.HTTP_201_CREATED, tags=["Transactions"])
 def create_transaction(
     transaction: schemas.TransactionCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Crear nueva transacción (ingreso o gasto)"""
@@ -243,7 +360,7 @@ def create_transaction(
 @app.get("/transactions/pending", response_model=List[schemas.PendingTransaction], tags=["Import"])
 def get_pending_transactions(
     batch_id: Optional[str] = None,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener transacciones pendientes de confirmación"""
@@ -254,7 +371,7 @@ def get_pending_transactions(
 def update_pending_transaction_category(
     transaction_id: int,
     update: schemas.PendingTransactionUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar categoría de transacción pendiente"""
@@ -269,7 +386,7 @@ def update_pending_transaction_category(
 @app.post("/transactions/pending/confirm", tags=["Import"])
 def confirm_pending_transactions(
     request: schemas.ConfirmTransactionsRequest,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Confirmar transacciones pendientes y convertirlas en transacciones reales"""
@@ -289,7 +406,7 @@ def confirm_pending_transactions(
 @app.delete("/transactions/pending/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Import"])
 def delete_pending_transaction(
     transaction_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Eliminar transacción pendiente"""
@@ -301,7 +418,7 @@ def delete_pending_transaction(
 @app.post("/transactions/import/excel", response_model=schemas.ImportSummary, tags=["Import"])
 async def import_transactions_from_excel(
     file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -319,8 +436,9 @@ async def import_transactions_from_excel(
         # Leer contenido del archivo
         content = await file.read()
         
-        # Parsear y crear transacciones pendientes
-        result = crud.parse_bank_excel(content, current_user.id, db)
+        # Parsear y crear transacciones pendientes. Es trabajo síncrono (pandas y
+        # la sesión de BD): en un hilo para no bloquear el event loop mientras dura
+        result = await anyio.to_thread.run_sync(crud.parse_bank_excel, content, current_user.id, db)
         
         return result
         
@@ -335,7 +453,7 @@ async def import_transactions_from_excel(
 @app.get("/transactions/{transaction_id}", response_model=schemas.Transaction, tags=["Transactions"])
 def get_transaction(
     transaction_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener transacción por ID"""
@@ -349,7 +467,7 @@ def get_transaction(
 def update_transaction(
     transaction_id: int,
     transaction: schemas.TransactionUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar transacción"""
@@ -362,7 +480,7 @@ def update_transaction(
 @app.delete("/transactions/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Transactions"])
 def delete_transaction(
     transaction_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Eliminar transacción"""
@@ -371,6 +489,32 @@ def delete_transaction(
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
 
 
+# Columnas de las exportaciones de transacciones
+EXPORT_COLUMNS = ["ID", "Fecha", "Tipo", "Categoría", "Monto", "Descripción", "Creado"]
+
+
+def _category_names(db: Session, user_id: int) -> dict:
+    """Mapa id -> nombre de todas las categorías del usuario (incluye inactivas)"""
+    return dict(
+        db.query(models.Category.id, models.Category.name)
+        .filter(models.Category.user_id == user_id)
+        .all()
+    )
+
+
+def _export_row(t: models.Transaction, category_names: dict) -> tuple:
+    """Fila de exportación para una transacción (orden de EXPORT_COLUMNS)"""
+    return (
+        t.id,
+        t.date,
+        "Ingreso" if t.type == 1 else "Gasto",
+        category_names.get(t.category_id, "N/A"),
+        t.amount,
+        t.description,
+        t.created_at.strftime("%Y-%m-%d %H:%M")
+    )
+
+
 @app.get("/transactions/export/excel", tags=["Transactions", "Export"])
 def export_transactions_excel(
     category_id: Optional[int] = None,
@@ -380,12 +524,12 @@ def export_transactions_excel(
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
     search_text: Optional[str] = None,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Exportar transacciones a Excel con los filtros aplicados"""
-    # Obtener transacciones con filtros
-    transactions = crud.get_transactions(
+    # Recorrer transacciones con filtros en lotes
+    transactions = crud.get_transactions_stream(
         db,
         current_user.id,
         category_id=category_id,
@@ -398,26 +542,16 @@ def export_transactions_excel(
         limit=10000  # Aumentar límite para exportación
     )
     
-    if not transactions:
+    # Nombres de categoría en una sola consulta
+    category_names = _category_names(db, current_user.id)
+    
+    data = [_export_row(t, category_names) for t in transactions]
+    
+    if not data:
         raise HTTPException(status_code=404, detail="No hay transacciones para exportar")
     
     # Convertir a DataFrame
-    data = []
-    for t in transactions:
-        # Obtener categoría
-        category = db.query(models.Category).filter(models.Category.id == t.category_id).first()
-        
-        data.append({
-            "ID": t.id,
-            "Fecha": t.date,
-            "Tipo": "Ingreso" if t.type == 1 else "Gasto",
-            "Categoría": category.name if category else "N/A",
-            "Monto": t.amount,
-            "Descripción": t.description,
-            "Creado": t.created_at.strftime("%Y-%m-%d %H:%M")
-        })
-    
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(data, columns=EXPORT_COLUMNS)
     
     # Crear Excel en memoria
     output = io.BytesIO()
@@ -459,12 +593,12 @@ def export_transactions_csv(
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
     search_text: Optional[str] = None,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Exportar transacciones a CSV con los filtros aplicados"""
-    # Obtener transacciones con filtros
-    transactions = crud.get_transactions(
+    # Recorrer transacciones con filtros en lotes
+    transactions = crud.get_transactions_stream(
         db,
         current_user.id,
         category_id=category_id,
@@ -477,30 +611,20 @@ def export_transactions_csv(
         limit=10000
     )
     
-    if not transactions:
-        raise HTTPException(status_code=404, detail="No hay transacciones para exportar")
+    # Nombres de categoría en una sola consulta
+    category_names = _category_names(db, current_user.id)
     
-    # Convertir a DataFrame
-    data = []
-    for t in transactions:
-        category = db.query(models.Category).filter(models.Category.id == t.category_id).first()
-        
-        data.append({
-            "ID": t.id,
-            "Fecha": t.date,
-            "Tipo": "Ingreso" if t.type == 1 else "Gasto",
-            "Categoría": category.name if category else "N/A",
-            "Monto": t.amount,
-            "Descripción": t.description,
-            "Creado": t.created_at.strftime("%Y-%m-%d %H:%M")
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Crear CSV en memoria
+    # Escribir el CSV en memoria fila a fila (la sesión se cierra antes de enviar la respuesta)
     output = io.StringIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')  # utf-8-sig para Excel en español
-    output.seek(0)
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    row_count = 0
+    for t in transactions:
+        writer.writerow(_export_row(t, category_names))
+        row_count += 1
+    
+    if not row_count:
+        raise HTTPException(status_code=404, detail="No hay transacciones para exportar")
     
     # Generar nombre de archivo
     filename = f"transacciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
@@ -513,21 +637,24 @@ def export_transactions_csv(
 
 
 # ========== BUDGETS ==========
-@app.get("/budgets", response_model=List[schemas.Budget], tags=["Budgets"])
+@app.get("/budgets", response_model=List[schemas.BudgetWithCategory], tags=["Budgets"])
 def get_budgets(
     month: Optional[int] = Query(None, ge=1, le=12),
     year: Optional[int] = Query(None, ge=2020, le=2100),
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Obtener presupuestos del usuario"""
-    return crud.get_budgets(db, current_user.id, month, year)
+    """Obtener presupuestos del usuario con categoría y estado actual"""
+    return [
+        schemas.BudgetWithCategory.from_status(budget_status)
+        for budget_status in crud.get_budgets_with_status(db, current_user.id, month, year)
+    ]
 
 
 @app.post("/budgets", response_model=schemas.Budget, status_code=status.HTTP_201_CREATED, tags=["Budgets"])
 def create_budget(
     budget: schemas.BudgetCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Crear nuevo presupuesto mensual"""
@@ -545,7 +672,7 @@ def create_budget(
 @app.get("/budgets/{budget_id}", response_model=schemas.BudgetWithCategory, tags=["Budgets"])
 def get_budget(
     budget_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener presupuesto por ID con estado actual"""
@@ -553,24 +680,15 @@ def get_budget(
     if not budget_status:
         raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
     
-    # Obtener categoría
-    category = crud.get_category(db, budget_status["budget"].category_id, current_user.id)
-    
-    return schemas.BudgetWithCategory(
-        **budget_status["budget"].__dict__,
-        category=category,
-        spent=budget_status["spent"],
-        remaining=budget_status["remaining"],
-        percentage_used=budget_status["percentage_used"],
-        is_exceeded=budget_status["is_exceeded"]
-    )
+    # La categoría viene cargada con el presupuesto (joinedload), sin otra consulta
+    return schemas.BudgetWithCategory.from_status(budget_status)
 
 
 @app.put("/budgets/{budget_id}", response_model=schemas.Budget, tags=["Budgets"])
 def update_budget(
     budget_id: int,
     budget: schemas.BudgetUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar presupuesto"""
@@ -583,7 +701,7 @@ def update_budget(
 @app.delete("/budgets/{budget_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Budgets"])
 def delete_budget(
     budget_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Eliminar presupuesto"""
@@ -596,7 +714,7 @@ def delete_budget(
 @app.get("/reminders", response_model=List[schemas.Reminder], tags=["Reminders"])
 def get_reminders(
     active_only: bool = True,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener recordatorios del usuario"""
@@ -605,28 +723,23 @@ def get_reminders(
 
 @app.get("/reminders/due", response_model=List[schemas.ReminderWithStatus], tags=["Reminders"])
 def get_due_reminders(
-    current_user: models.User = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, description="Solo los N más próximos"),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener recordatorios próximos a vencer"""
-    due_reminders = crud.get_due_reminders(db, current_user.id)
-    
-    result = []
-    for item in due_reminders:
-        reminder_data = schemas.ReminderWithStatus(
-            **item["reminder"].__dict__,
-            is_due=item["is_due"],
-            days_until_due=item["days_until_due"]
-        )
-        result.append(reminder_data)
+    due_reminders = crud.get_due_reminders(db, current_user.id, limit=limit)
     
-    return result
+    return [
+        schemas.ReminderWithStatus.from_reminder(item["reminder"], item["is_due"], item["days_until_due"])
+        for item in due_reminders
+    ]
 
 
 @app.post("/reminders", response_model=schemas.Reminder, status_code=status.HTTP_201_CREATED, tags=["Reminders"])
 def create_reminder(
     reminder: schemas.ReminderCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Crear nuevo recordatorio de pago"""
@@ -636,7 +749,7 @@ def create_reminder(
 @app.get("/reminders/{reminder_id}", response_model=schemas.Reminder, tags=["Reminders"])
 def get_reminder(
     reminder_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener recordatorio por ID"""
@@ -650,7 +763,7 @@ def get_reminder(
 def update_reminder(
     reminder_id: int,
     reminder: schemas.ReminderUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar recordatorio"""
@@ -664,7 +777,7 @@ def update_reminder(
 def mark_reminder_paid(
     reminder_id: int,
     request: schemas.MarkReminderPaidRequest,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Marcar recordatorio como pagado y crear transacción automática"""
@@ -692,7 +805,7 @@ def mark_reminder_paid(
 @app.delete("/reminders/{reminder_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Reminders"])
 def delete_reminder(
     reminder_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Eliminar recordatorio"""
@@ -705,7 +818,7 @@ def delete_reminder(
 @app.get("/notifications/pending-reminders", tags=["Notifications"])
 def get_pending_reminders(
     days_ahead: int = Query(default=7, ge=1, le=30, description="Días hacia adelante para buscar recordatorios"),
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener recordatorios próximos a vencer"""
@@ -716,7 +829,7 @@ def get_pending_reminders(
 def get_budget_alerts(
     month: Optional[int] = Query(default=None, ge=1, le=12),
     year: Optional[int] = Query(default=None, ge=2020, le=2100),
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener alertas de presupuestos excedidos o cerca del límite"""
@@ -734,7 +847,7 @@ def get_budget_alerts(
 def get_monthly_stats(
     month: int = Query(..., ge=1, le=12),
     year: int = Query(..., ge=2020, le=2100),
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener estadísticas mensuales"""
@@ -743,7 +856,7 @@ def get_monthly_stats(
 
 @app.get("/stats/current-month", response_model=schemas.MonthlyStats, tags=["Statistics"])
 def get_current_month_stats(
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener estadísticas del mes actual"""
@@ -754,7 +867,7 @@ def get_current_month_stats(
 @app.get("/stats/trends", tags=["Statistics"])
 def get_trends(
     months: int = Query(default=6, ge=3, le=12, description="Número de meses históricos"),
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener tendencias de gastos e ingresos de los últimos N meses"""
@@ -764,7 +877,7 @@ def get_trends(
 # ========== IMPORT RULES ==========
 @app.get("/import-rules", response_model=List[schemas.ImportRule], tags=["Import"])
 def get_import_rules(
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener todas las reglas de importación del usuario"""
@@ -774,7 +887,7 @@ def get_import_rules(
 @app.post("/import-rules", response_model=schemas.ImportRule, status_code=status.HTTP_201_CREATED, tags=["Import"])
 def create_import_rule(
     rule: schemas.ImportRuleCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Crear nueva regla de importación"""
@@ -790,7 +903,7 @@ def create_import_rule(
 def update_import_rule(
     rule_id: int,
     rule: schemas.ImportRuleUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Actualizar regla de importación"""
@@ -803,7 +916,7 @@ def update_import_rule(
 @app.delete("/import-rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Import"])
 def delete_import_rule(
     rule_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Eliminar regla de importación"""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Date, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -84,6 +84,28 @@ class Category(Base):
 class Transaction(Base):
     """Transacciones (ingresos y gastos)"""
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Filtros por usuario y rango de fechas (resúmenes, tendencias, presupuestos,
+        # listado ordenado por fecha). En PostgreSQL incluye las columnas que suman
+        # los agregados para resolverlos solo con el índice. También sirve a la
+        # paginación por clave (date, id): SQLite agrega el rowid (id) a cada
+        # índice y PostgreSQL recorre el mismo prefijo hacia atrás.
+        Index(
+            "ix_transactions_user_date", "user_id", "date",
+            postgresql_include=["category_id", "type", "amount"]
+        ),
+        # Listado y gasto filtrados por categoría
+        Index("ix_transactions_user_category_date", "user_id", "category_id", "date"),
+        # Gasto del mes por categoría (estado de presupuestos): igualdad en
+        # usuario, categoría y tipo, y rango de fechas sobre el resto del índice
+        Index(
+            "ix_transactions_budget_status", "user_id", "category_id", "type", "date",
+            postgresql_include=["amount"]
+        ),
+        # Detección de duplicados al importar cartolas: la lectura de claves
+        # (fecha, monto, descripción) del usuario se resuelve solo con el índice
+        Index("ix_transactions_dedupe", "user_id", "date", "amount", "description"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -103,6 +125,11 @@ class Transaction(Base):
 class Budget(Base):
     """Presupuestos mensuales por categoría"""
     __tablename__ = "budgets"
+    __table_args__ = (
+        # Un solo presupuesto por categoría y mes. Índice único con nombre para que
+        # database.ensure_budget_unique_index lo reconozca también en SQLite
+        Index("uq_budgets_user_category_month", "user_id", "category_id", "month", "year", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -157,6 +184,10 @@ class ImportRule(Base):
 class PendingTransaction(Base):
     """Transacciones importadas pendientes de confirmación"""
     __tablename__ = "pending_transactions"
+    __table_args__ = (
+        # Detección de duplicados al importar (mismas claves que en transactions)
+        Index("ix_pending_transactions_dedupe", "user_id", "date", "amount", "description"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,7 +1,7 @@
 """
 Schemas Pydantic para validación de datos
 """
-from pydantic import BaseModel, EmailStr, Field, validator, field_serializer
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, validator, field_serializer
 from typing import Optional, List
 from datetime import date, datetime
 from enum import Enum
@@ -78,8 +78,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserLogin(BaseModel):
@@ -123,8 +122,7 @@ class Category(CategoryBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ========== TRANSACTION SCHEMAS ==========
@@ -179,15 +177,13 @@ class Transaction(BaseModel):
             return TRANSACTION_TYPE_MAP.get(v, 'gasto')
         return v
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TransactionWithCategory(Transaction):
     category: Category
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ========== BUDGET SCHEMAS ==========
@@ -217,8 +213,7 @@ class Budget(BudgetBase):
     user_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class BudgetWithCategory(Budget):
@@ -228,8 +223,13 @@ class BudgetWithCategory(Budget):
     percentage_used: float = 0.0
     is_exceeded: bool = False
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @classmethod
+    def from_status(cls, budget_status: dict) -> "BudgetWithCategory":
+        """Construir desde el estado de crud (presupuesto ORM leído por atributos, con su categoría)"""
+        status = {key: value for key, value in budget_status.items() if key != "budget"}
+        return cls.model_validate(budget_status["budget"]).model_copy(update=status)
 
 
 # ========== REMINDER SCHEMAS ==========
@@ -285,16 +285,21 @@ class Reminder(BaseModel):
             return FREQUENCY_MAP.get(v, 'mensual')
         return v
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ReminderWithStatus(Reminder):
     is_due: bool = False
     days_until_due: int = 0
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+    
+    @classmethod
+    def from_reminder(cls, reminder, is_due: bool, days_until_due: int) -> "ReminderWithStatus":
+        """Construir desde el recordatorio ORM leyendo sus atributos (sin copiar su __dict__)"""
+        return cls.model_validate(reminder).model_copy(
+            update={"is_due": is_due, "days_until_due": days_until_due}
+        )
 
 
 class MarkReminderPaidRequest(BaseModel):
@@ -306,8 +311,7 @@ class MarkReminderPaidResponse(BaseModel):
     reminder: Reminder
     transaction: 'Transaction'
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ========== STATISTICS SCHEMAS ==========
@@ -357,8 +361,7 @@ class Bill(BillBase):
     id: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Pago Schemas
@@ -377,8 +380,7 @@ class Pago(PagoBase):
     id: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Presupuesto Schemas
@@ -397,16 +399,14 @@ class Presupuesto(PresupuestoBase):
     id: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Response Models
 class BillWithPagos(Bill):
     pagos: List[Pago] = []
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ========== IMPORT RULES SCHEMAS ==========
@@ -433,14 +433,13 @@ class ImportRule(ImportRuleBase):
     user_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ========== PENDING TRANSACTIONS SCHEMAS ==========
 class PendingTransactionBase(BaseModel):
     amount: float
-    type: TransactionType
+    type: TransactionTypeEnum
     description: str
     date: date
     raw_description: Optional[str] = None
@@ -477,8 +476,7 @@ class PendingTransaction(BaseModel):
             return TRANSACTION_TYPE_MAP.get(v, 'gasto')
         return v
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ImportSummary(BaseModel):
@@ -1000,8 +1000,8 @@ def view_budgets():
     budgets = api_get("/budgets", params={"month": month, "year": year})
     
     if budgets:
-        for budget_id in [b['id'] for b in budgets]:
-            budget_detail = api_get(f"/budgets/{budget_id}")
+        # /budgets ya trae la categoría y el gasto de cada presupuesto
+        for budget_detail in budgets:
             
             if budget_detail:
                 cat = budget_detail['category']
@@ -0,0 +1,55 @@
+"""
+Fixtures comunes: API sobre una base SQLite temporal y un usuario nuevo por test
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# backend.database lee la configuración al importarse: debe definirse antes
+_DB_DIR = tempfile.mkdtemp(prefix="control-gastos-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["AUTO_CREATE_SCHEMA"] = "true"
+# Hash de contraseñas barato: los tests no miden seguridad
+os.environ["ARGON2_TIME_COST"] = "1"
+os.environ["ARGON2_MEMORY_COST"] = "1024"
+os.environ["ARGON2_PARALLELISM"] = "1"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Cliente HTTP de la API (ejecuta el lifespan una sola vez)"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def headers(client):
+    """
+    Headers de autenticación de un usuario recién registrado
+
+    Cada test usa su propio usuario: los datos y los agregados en cache de un
+    test no se ven desde otro.
+    """
+    suffix = uuid.uuid4().hex[:12]
+    email = f"user-{suffix}@example.com"
+    response = client.post(
+        "/auth/register",
+        json={"username": f"user_{suffix}", "email": email, "password": "secret123"}
+    )
+    assert response.status_code == 201, response.text
+
+    response = client.post("/auth/login", data={"username": email, "password": "secret123"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def categories(client, headers):
+    """Categorías por defecto creadas al registrar el usuario"""
+    return client.get("/categories", headers=headers).json()
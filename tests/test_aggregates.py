@@ -0,0 +1,65 @@
+"""
+Agregados en cache (gasto de presupuestos, resumen mensual, tendencias): cada
+escritura de transacciones debe verse en la lectura siguiente
+"""
+from datetime import date, timedelta
+
+
+def _expense(client, headers, category_id, amount, tx_date):
+    response = client.post("/transactions", headers=headers, json={
+        "category_id": category_id,
+        "amount": amount,
+        "type": "gasto",
+        "description": "gasto",
+        "date": tx_date.isoformat(),
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _monthly_expenses(client, headers, month_date):
+    return client.get(
+        f"/stats/monthly?month={month_date.month}&year={month_date.year}", headers=headers
+    ).json()["total_expenses"]
+
+
+def test_budget_spent_follows_transaction_writes(client, headers, categories):
+    today = date.today()
+    category_id = categories[0]["id"]
+    budget = client.post("/budgets", headers=headers, json={
+        "category_id": category_id, "amount": 100, "month": today.month, "year": today.year
+    }).json()
+    url = f"/budgets/{budget['id']}"
+
+    # Primera lectura: deja el gasto en cache
+    assert client.get(url, headers=headers).json()["spent"] == 0
+
+    tx_id = _expense(client, headers, category_id, 60, today)
+    assert client.get(url, headers=headers).json()["spent"] == 60
+
+    client.put(f"/transactions/{tx_id}", headers=headers, json={"amount": 120})
+    status = client.get(url, headers=headers).json()
+    assert status["spent"] == 120 and status["is_exceeded"]
+    assert client.get("/budgets", headers=headers).json()[0]["spent"] == 120
+
+    assert client.delete(f"/transactions/{tx_id}", headers=headers).status_code == 204
+    assert client.get(url, headers=headers).json()["spent"] == 0
+
+
+def test_writes_invalidate_only_their_month(client, headers, categories):
+    today = date.today()
+    previous_month = today.replace(day=1) - timedelta(days=1)
+    category_id = categories[0]["id"]
+    old_id = _expense(client, headers, category_id, 30, previous_month)
+    _expense(client, headers, category_id, 50, today)
+
+    assert _monthly_expenses(client, headers, previous_month) == 30
+    assert _monthly_expenses(client, headers, today) == 50
+    client.get("/stats/trends?months=3", headers=headers)
+
+    client.put(f"/transactions/{old_id}", headers=headers, json={"amount": 45})
+
+    assert _monthly_expenses(client, headers, previous_month) == 45
+    assert _monthly_expenses(client, headers, today) == 50
+    trends = client.get("/stats/trends?months=3", headers=headers).json()
+    assert trends["expenses"][-2:] == [45, 50]
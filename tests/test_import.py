@@ -0,0 +1,91 @@
+"""
+Importación de cartolas: lectura de fechas y montos, reglas de categorización y
+detección de duplicados
+"""
+import io
+from datetime import date
+
+import pandas as pd
+
+from backend import crud
+
+CSV_CARTOLA = (
+    "Fecha,Descripción,Cargo,Abono\n"
+    "2026-01-04,SUPERMERCADO LIDER,45.000,\n"
+    "05/01/2026,SUELDO MENSUAL,,1.500.000\n"
+    "06/01/2026,UBER VIAJE,8.500,\n"
+).encode("utf-8")
+
+
+def _import(client, headers, filename, content):
+    response = client.post("/transactions/import/excel", headers=headers, files={"file": (filename, content)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _by_description(summary):
+    return {p["description"]: p for p in summary["pending_transactions"]}
+
+
+def test_iso_dates_are_year_first_and_the_rest_day_first():
+    assert crud._parse_date("2026-01-04") == date(2026, 1, 4)
+    assert crud._parse_date("05/01/2026") == date(2026, 1, 5)
+    assert crud._parse_date("sin fecha") is None
+
+    column = pd.Series(["2026-01-04", "05/01/2026", pd.Timestamp(2026, 3, 2), "02/Ene"], dtype=object)
+    parsed = crud._date_column(column)
+    assert list(parsed[:3].dt.date) == [date(2026, 1, 4), date(2026, 1, 5), date(2026, 3, 2)]
+    assert pd.isna(parsed[3])
+
+
+def test_csv_and_excel_read_the_same_dates(client, headers):
+    csv_rows = _by_description(_import(client, headers, "cartola.csv", CSV_CARTOLA))
+
+    buffer = io.BytesIO()
+    pd.DataFrame({
+        "Fecha": ["2026-02-04", "05/02/2026"],
+        "Descripción": ["FARMACIA", "ARRIENDO"],
+        "Cargo": [12500.0, 300000.0],
+    }).to_excel(buffer, index=False)
+    excel_rows = _by_description(_import(client, headers, "cartola.xlsx", buffer.getvalue()))
+
+    assert csv_rows["SUPERMERCADO LIDER"]["date"] == "2026-01-04"
+    assert csv_rows["SUELDO MENSUAL"]["date"] == "2026-01-05"
+    assert excel_rows["FARMACIA"]["date"] == "2026-02-04"
+    assert excel_rows["ARRIENDO"]["date"] == "2026-02-05"
+
+
+def test_amounts_and_types_from_chilean_format(client, headers):
+    rows = _by_description(_import(client, headers, "cartola.csv", CSV_CARTOLA))
+
+    assert rows["SUPERMERCADO LIDER"]["amount"] == 45000
+    assert rows["SUPERMERCADO LIDER"]["type"] == "gasto"
+    assert rows["SUELDO MENSUAL"]["amount"] == 1500000
+    assert rows["SUELDO MENSUAL"]["type"] == "ingreso"
+
+
+def test_import_rules_pick_the_highest_priority_keyword(client, headers, categories):
+    low, high, transport = (category["id"] for category in categories[:3])
+    for category_id, keyword, priority in [(low, "super", 1), (high, "lider", 5), (transport, "uber", 1)]:
+        response = client.post("/import-rules", headers=headers, json={
+            "category_id": category_id, "keyword": keyword, "priority": priority
+        })
+        assert response.status_code == 201, response.text
+
+    summary = _import(client, headers, "cartola.csv", CSV_CARTOLA)
+    rows = _by_description(summary)
+
+    assert summary["auto_categorized"] == 2
+    assert rows["SUPERMERCADO LIDER"]["category_id"] == high
+    assert rows["UBER VIAJE"]["category_id"] == transport
+    assert rows["SUELDO MENSUAL"]["category_id"] is None
+
+
+def test_reimporting_the_same_file_skips_every_row(client, headers):
+    first = _import(client, headers, "cartola.csv", CSV_CARTOLA)
+    again = _import(client, headers, "cartola.csv", CSV_CARTOLA)
+
+    assert first["total_imported"] == 3
+    assert again["total_imported"] == 0
+    assert again["duplicates_skipped"] == 3
+    assert len(client.get("/transactions/pending", headers=headers).json()) == 3
@@ -0,0 +1,57 @@
+"""
+Listado de transacciones: paginación por clave (date, id)
+"""
+from datetime import date, timedelta
+
+
+def _create_transactions(client, headers, category_id, dates):
+    for i, tx_date in enumerate(dates):
+        response = client.post("/transactions", headers=headers, json={
+            "category_id": category_id,
+            "amount": 10 + i,
+            "type": "gasto",
+            "description": f"tx {i}",
+            "date": tx_date.isoformat(),
+        })
+        assert response.status_code == 201, response.text
+
+
+def test_cursor_walks_every_transaction_once(client, headers, categories):
+    today = date.today()
+    # Tres en la misma fecha con páginas de 2: el id desempata entre páginas
+    dates = [today, today - timedelta(days=1), today, today - timedelta(days=2), today]
+    _create_transactions(client, headers, categories[0]["id"], dates)
+
+    full = client.get("/transactions", headers=headers).json()
+    assert [(t["date"], t["id"]) for t in full] == sorted(((t["date"], t["id"]) for t in full), reverse=True)
+
+    seen = []
+    url = "/transactions?limit=2"
+    while True:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        seen.extend(t["id"] for t in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        url = f"/transactions?limit=2&cursor={cursor}"
+
+    assert seen == [t["id"] for t in full]
+
+
+def test_after_date_and_id_match_cursor(client, headers, categories):
+    today = date.today()
+    _create_transactions(client, headers, categories[0]["id"], [today] * 3)
+
+    first = client.get("/transactions?limit=1", headers=headers)
+    last = first.json()[-1]
+    by_cursor = client.get(f"/transactions?limit=2&cursor={first.headers['X-Next-Cursor']}", headers=headers)
+    by_key = client.get(f"/transactions?limit=2&after_date={last['date']}&after_id={last['id']}", headers=headers)
+
+    assert by_cursor.json() == by_key.json()
+    assert [t["id"] for t in by_key.json()] == [t["id"] for t in client.get("/transactions", headers=headers).json()[1:]]
+
+
+def test_invalid_cursor_is_rejected(client, headers):
+    assert client.get("/transactions?cursor=bad", headers=headers).status_code == 400
+    assert client.get("/transactions?after_id=1", headers=headers).status_code == 400